@@ -0,0 +1,67 @@
+#----------------------------------------------------------------------------#
+# JSON API helpers.
+#
+# Serialization, opaque pagination cursors and ?fields= parsing for the
+# /api/v1 blueprint in app.py. Responses are encoded with orjson when it is
+# installed and with the json module otherwise, both writing datetimes in
+# ISO 8601.
+#----------------------------------------------------------------------------#
+
+import base64
+import json
+
+from flask import Response
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+class ApiError(Exception):
+  # Raised by the API views, answered with {"error": message} and status
+  def __init__(self, status, message):
+    super(ApiError, self).__init__(message)
+    self.status = status
+    self.message = message
+
+def json_default(value):
+  if hasattr(value, 'isoformat'):
+    return value.isoformat()
+  raise TypeError('%r is not JSON serializable' % (value,))
+
+def dumps(data):
+  # Encodes data to UTF-8 JSON bytes
+  if orjson is not None:
+    return orjson.dumps(data, default=json_default)
+  return json.dumps(data, default=json_default, separators=(',', ':')).encode('utf-8')
+
+def json_response(data, status=200):
+  return Response(dumps(data), status=status, mimetype='application/json')
+
+def encode_cursor(*values):
+  # Packs the sort key of the last row of a page into an opaque token
+  return base64.urlsafe_b64encode(dumps(list(values))).rstrip(b'=').decode('ascii')
+
+def decode_cursor(cursor, size):
+  # Unpacks a token made by encode_cursor with size values
+  try:
+    values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+  except ValueError:
+    raise ApiError(400, 'Invalid cursor.')
+  if not isinstance(values, list) or len(values) != size:
+    raise ApiError(400, 'Invalid cursor.')
+  return values
+
+def parse_fields(value, allowed, default):
+  # Returns the comma separated fields asked for, in the order given, or default
+  if not value:
+    return list(default)
+  fields = []
+  for field in value.split(','):
+    field = field.strip()
+    if field and field not in fields:
+      fields.append(field)
+  unknown = [field for field in fields if field not in allowed]
+  if unknown:
+    raise ApiError(400, 'Unknown fields: %s.' % ', '.join(unknown))
+  return fields
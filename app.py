@@ -3,20 +3,43 @@
 #----------------------------------------------------------------------------#
 
 import json
+import click
+import hashlib
+import ipaddress
+import time
+from functools import wraps
 import babel
 import sys
 import logging
 import pytz
 import dateutil.parser
-from datetime import datetime
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify
+from datetime import datetime, timedelta
+from itertools import groupby
+from flask import Flask, Blueprint, has_request_context, render_template, request, Response, flash, redirect, url_for, abort, jsonify, session, g, make_response, stream_with_context
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import distinct
+from sqlalchemy import distinct, event, func, inspect, literal, select, and_, or_
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import joinedload, selectinload, validates
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 from logging import Formatter, FileHandler
 from flask_wtf import FlaskForm
 from forms import *
+from search import get_search_engine, register as register_search
+from areas import area_summary, refresh_area_summary, register as register_areas
+from bookings import MAX_DURATION, OVERLAP_CONSTRAINT, find_conflicts, free_windows, is_overlap_error, register as register_bookings
+from suggest import PrefixIndex
+from cache import make_cache
+from pool import engine_options, pool_stats, register as register_pool
+from timing import observers as timing_observers, register as register_timing
+from metrics import make_metrics
+from logs import LogQueue, request_log_line, sample_request
+from replicas import RoutingSession, primary, replica_binds, use_replica
+from api import ApiError, decode_cursor, encode_cursor, json_response, parse_fields
+from bulk import EXPORT_MIMETYPES, ErrorLog, RowValidator, batches, export_chunks, insert_rows, read_rows
+from flask.logging import default_handler
 from flask_migrate import Migrate
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -28,26 +51,142 @@ from flask_migrate import Migrate
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+if app.config['PROXY_COUNT']:
+  app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_COUNT'], x_proto=app.config['PROXY_COUNT'], x_host=app.config['PROXY_COUNT'])
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config, make_url(app.config['SQLALCHEMY_DATABASE_URI']))
+app.config['SQLALCHEMY_BINDS'] = replica_binds(app.config, lambda url: engine_options(app.config, url))
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+with app.app_context():
+  for engine in db.engines.values():
+    register_pool(engine, app.config)
+
+# Bind keys of the read replicas, empty when reads go to the primary
+REPLICA_BINDS = sorted(app.config['SQLALCHEMY_BINDS'])
 migrate = Migrate(app, db)
 
+# Server-Timing header and one log line per request
+register_timing(app)
+
+# Read-through cache of the venue and artist detail page data
+page_cache = make_cache(app.config)
+
+# Request, pool, cache and failure metrics served on /metrics, None without prometheus_client
+metrics = make_metrics(app.config)
+if metrics is not None:
+  timing_observers.append(metrics.observe_request)
+  with app.app_context():
+    for bind, engine in db.engines.items():
+      metrics.watch_pool(bind or 'primary', engine)
+  metrics.watch_cache('page', page_cache)
+
+# Counts a create, edit or delete rolled back on an error
+def count_failure(action, model):
+  if metrics is not None:
+    metrics.count_failure(action, model)
+
+# In-memory name indexes behind /search/suggest, loaded on first use and rebuilt
+# when another process changed the names
+venue_suggestions = PrefixIndex(app.config['SUGGESTIONS_REFRESH_SECONDS'])
+artist_suggestions = PrefixIndex(app.config['SUGGESTIONS_REFRESH_SECONDS'])
+
+# Logs a sample of the requests with their headers, and the start of their body when
+# configured to, captured as the view reads it
 @app.before_request
-def log_request_info():
-  app.logger.debug('Headers: %s', request.headers)
-  app.logger.debug('Body: %s', request.get_data())
+def sample_request_log():
+  g.log_request = sample_request(request.environ, app.config['REQUEST_LOG_SAMPLE_RATE'], app.config['REQUEST_LOG_BODY_BYTES'])
+
+@app.after_request
+def log_request(response):
+  if g.pop('log_request', False):
+    app.logger.getChild('requests').info(request_log_line(request, response))
+  return response
+
+# Reads GET and HEAD requests from a replica, unless this browser session wrote recently
+@app.before_request
+def route_reads():
+  if REPLICA_BINDS and request.method in ('GET', 'HEAD') and session.get('primary_until', 0) < time.time():
+    use_replica(db.session, REPLICA_BINDS)
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+# Stores timezone-aware datetimes in UTC and always returns them timezone-aware,
+# including on backends such as SQLite that drop the offset
+class UTCDateTime(db.TypeDecorator):
+  impl = db.DateTime(timezone=True)
+  cache_ok = True
+
+  def process_bind_param(self, value, dialect):
+    if value is not None:
+      if value.tzinfo is None:
+        raise ValueError('UTCDateTime requires a timezone-aware datetime')
+      value = value.astimezone(pytz.utc)
+    return value
+
+  def process_result_value(self, value, dialect):
+    if value is not None and value.tzinfo is None:
+      value = value.replace(tzinfo=pytz.utc)
+    return value
+
+def utcnow():
+  return datetime.utcnow().replace(tzinfo=pytz.utc)
+
+# Parses an ISO 8601 date or time as UTC, naive values being UTC already
+def parse_utc(value):
+  date = dateutil.parser.isoparse(value)
+  return date.replace(tzinfo=pytz.utc) if date.tzinfo is None else date.astimezone(pytz.utc)
+
+# End of a show booked without an end time
+def default_ends_at(starts_at):
+  return starts_at + timedelta(minutes=app.config['SHOW_DEFAULT_DURATION'])
+
+class Genre(db.Model):
+  __tablename__ = 'genre'
+  id = db.Column(db.Integer, primary_key=True)
+  name = db.Column(db.String(120), nullable=False, unique=True)
+
+  # Returns the (value, label) pairs for the genres select fields
+  @classmethod
+  def choices(cls):
+    return [(name, name) for name, in db.session.query(cls.name).order_by(cls.name)]
+
+  # Returns the genres matching the submitted names, unknown names are ignored
+  @classmethod
+  def by_names(cls, names):
+    if not names:
+      return []
+    return cls.query.filter(cls.name.in_(names)).all()
+
+# Association tables, indexed on genre_id first for the ?genre= listings
+venue_genre = db.Table('venue_genre',
+  db.Column('venue_id', db.Integer, db.ForeignKey('venue.id', ondelete='CASCADE'), primary_key=True),
+  db.Column('genre_id', db.Integer, db.ForeignKey('genre.id'), primary_key=True),
+  db.Index('ix_venue_genre_genre_id_venue_id', 'genre_id', 'venue_id')
+)
+
+artist_genre = db.Table('artist_genre',
+  db.Column('artist_id', db.Integer, db.ForeignKey('artist.id', ondelete='CASCADE'), primary_key=True),
+  db.Column('genre_id', db.Integer, db.ForeignKey('genre.id'), primary_key=True),
+  db.Index('ix_artist_genre_genre_id_artist_id', 'genre_id', 'artist_id')
+)
+
 class Venue(db.Model):
   __tablename__ = 'venue'
+  __table_args__ = (
+    # Serves the area-ordered /venues listing
+    db.Index('ix_venue_state_city', 'state', 'city'),
+    # Serves the Last-Modified and ETag lookups of the listings
+    db.Index('ix_venue_updated_at', 'updated_at'),
+    # Finds the venues whose next show has started for recount-shows
+    db.Index('ix_venue_next_show_at', 'next_show_at'),
+  )
   id = db.Column(db.Integer, primary_key=True)
   name = db.Column(db.String, nullable=False)
   city = db.Column(db.String(120), nullable=False)
   state = db.Column(db.String(120), nullable=False)
   address = db.Column(db.String(120), nullable=False)
-  genres = db.Column(db.String(120), nullable=False)
+  genres = db.relationship('Genre', secondary=venue_genre, order_by='Genre.name', lazy=True)
   phone = db.Column(db.String(120))
   image_link = db.Column(db.String(500), nullable=False, server_default='https://via.placeholder.com/300')
   facebook_link = db.Column(db.String(120))
@@ -55,6 +194,11 @@ class Venue(db.Model):
   seeking_talent = db.Column(db.Boolean, default=False)
   seeking_description = db.Column(db.String(120))
   shows = db.relationship('Show', backref='venue', lazy=True)
+  # Show counters maintained by the Show events and the recount-shows command
+  upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  next_show_at = db.Column(UTCDateTime)
+  updated_at = db.Column(UTCDateTime, nullable=False, default=utcnow)
 
   # Returns a venue with ID and name only to be used within aggregations
   def get_venue(venue):
@@ -63,32 +207,148 @@ class Venue(db.Model):
 
 class Artist(db.Model):
   __tablename__ = 'artist'
+  __table_args__ = (
+    # Serves the Last-Modified and ETag lookups of the listings
+    db.Index('ix_artist_updated_at', 'updated_at'),
+    # Finds the artists whose next show has started for recount-shows
+    db.Index('ix_artist_next_show_at', 'next_show_at'),
+  )
   id = db.Column(db.Integer, primary_key=True)
   name = db.Column(db.String, nullable=False)
   city = db.Column(db.String(120), nullable=False)
   state = db.Column(db.String(120), nullable=False)
   phone = db.Column(db.String(120), nullable=False)
-  genres = db.Column(db.String(120), nullable=False)
+  genres = db.relationship('Genre', secondary=artist_genre, order_by='Genre.name', lazy=True)
   image_link = db.Column(db.String(500), nullable=False, server_default='https://via.placeholder.com/300')
   facebook_link = db.Column(db.String(120))
   website = db.Column(db.String(120))
   seeking_venue = db.Column(db.Boolean, default=False)
   seeking_description = db.Column(db.String(120))
   shows = db.relationship('Show', backref='artist', lazy=True)
+  # Show counters maintained by the Show events and the recount-shows command
+  upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  next_show_at = db.Column(UTCDateTime)
+  updated_at = db.Column(UTCDateTime, nullable=False, default=utcnow)
 
 class Show(db.Model):
   __tablename__ = 'show'
+  __table_args__ = (
+    # Legacy index on the string start time, dropped with the start_time column
+    db.Index('ix_show_start_time_id', 'start_time', 'id'),
+    # Serves the start time ordered /shows feed and its keyset cursor
+    db.Index('ix_show_starts_at_id', 'starts_at', 'id'),
+    # Serves the Last-Modified and ETag lookups of the listings
+    db.Index('ix_show_updated_at', 'updated_at'),
+    # Serves the per venue and per artist show lookups and recounts
+    db.Index('ix_show_venue_id_starts_at', 'venue_id', 'starts_at'),
+    db.Index('ix_show_artist_id_starts_at', 'artist_id', 'starts_at'),
+    db.CheckConstraint('ends_at > starts_at', name='ck_show_duration'),
+    # One show at a time per venue, SQLite gets the equivalent triggers from bookings.py
+    ExcludeConstraint(
+      ('venue_id', '='), (func.tstzrange(db.column('starts_at'), db.column('ends_at')), '&&'),
+      name=OVERLAP_CONSTRAINT, using='gist'
+    ).ddl_if(dialect='postgresql'),
+  )
   id = db.Column(db.Integer, primary_key=True)
   artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'), nullable=False)
   venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False)
+  starts_at = db.Column(UTCDateTime)
+  ends_at = db.Column(UTCDateTime, nullable=False, default=lambda context: default_ends_at(context.get_current_parameters()['starts_at']))
+  # Legacy ISO 8601 string, dual-written from starts_at until the column is dropped
   start_time = db.Column(db.String(120), nullable=False)
+  updated_at = db.Column(UTCDateTime, nullable=False, default=utcnow)
+
+  @validates('starts_at')
+  def sync_start_time(self, key, value):
+    self.start_time = value.isoformat() if value is not None else None
+    return value
+
+register_search(db.metadata)
+register_areas(db.metadata)
+register_bookings(Show.__table__)
+
+# Bumps updated_at on every modified venue, artist and show, including
+# changes that only touch a relationship such as the genres, and notes
+# venue and show changes for the area summary
+@event.listens_for(db.session, 'before_flush')
+def touch_updated_at(session, flush_context, instances):
+  for instance in session.dirty:
+    if isinstance(instance, (Venue, Artist, Show)) and session.is_modified(instance):
+      instance.updated_at = utcnow()
+  if any(isinstance(instance, (Venue, Show)) for instance in (*session.new, *session.dirty, *session.deleted)):
+    session.info['areas_changed'] = True
+
+# Refreshes the Postgres area summary once the venue or show writes are committed,
+# when configured to, otherwise `flask refresh-areas` does it on a schedule
+@event.listens_for(db.session, 'after_commit')
+def refresh_areas_after_commit(session):
+  if session.info.pop('areas_changed', False) and app.config['AREA_SUMMARY_REFRESH_ON_WRITE']:
+    with db.engine.begin() as connection:
+      refresh_area_summary(connection)
+
+# Keeps the browser session that committed a write on the primary for a while
+@event.listens_for(db.session, 'after_flush')
+def note_write(db_session, flush_context):
+  db_session.info['wrote'] = True
+
+@event.listens_for(db.session, 'after_commit')
+def stick_to_primary(db_session):
+  if db_session.info.pop('wrote', False) and REPLICA_BINDS and has_request_context():
+    session['primary_until'] = time.time() + app.config['DATABASE_REPLICA_STICKY_SECONDS']
+
+#  Show counters
+#  ----------------------------------------------------------------
+
+# Recomputes the show counters of the given venues or artists from the show table. Like every
+# counter write it bumps updated_at, so the listing validators change with the counters.
+def recount_shows(connection, model, ids):
+  table = model.__table__
+  shows = Show.__table__
+  owner_id = shows.c.venue_id if model is Venue else shows.c.artist_id
+  now = utcnow()
+  connection.execute(table.update().where(table.c.id.in_(ids)).values(
+    upcoming_shows_count=select(func.count()).where(owner_id == table.c.id, shows.c.starts_at >= now).scalar_subquery(),
+    past_shows_count=select(func.count()).where(owner_id == table.c.id, shows.c.starts_at < now).scalar_subquery(),
+    next_show_at=select(func.min(shows.c.starts_at)).where(owner_id == table.c.id, shows.c.starts_at >= now).scalar_subquery(),
+    updated_at=now
+  ))
+
+# Counts a new show in its venue and artist within the same transaction, without reading
+@event.listens_for(Show, 'after_insert')
+def count_inserted_show(mapper, connection, show):
+  now = utcnow()
+  for table, id in ((Venue.__table__, show.venue_id), (Artist.__table__, show.artist_id)):
+    if show.starts_at >= now:
+      connection.execute(table.update().where(table.c.id == id).values(upcoming_shows_count=table.c.upcoming_shows_count + 1, updated_at=now))
+      connection.execute(table.update().where(table.c.id == id)
+        .where(or_(table.c.next_show_at == None, table.c.next_show_at > show.starts_at))
+        .values(next_show_at=show.starts_at))
+    else:
+      connection.execute(table.update().where(table.c.id == id).values(past_shows_count=table.c.past_shows_count + 1, updated_at=now))
+
+# A deleted show may have been the next one, so its venue and artist are recounted
+@event.listens_for(Show, 'after_delete')
+def count_deleted_show(mapper, connection, show):
+  recount_shows(connection, Venue, [show.venue_id])
+  recount_shows(connection, Artist, [show.artist_id])
+
+# Moving a show in time or to another venue or artist recounts the old and new owners
+@event.listens_for(Show, 'after_update')
+def count_updated_show(mapper, connection, show):
+  state = inspect(show)
+  if not any(state.attrs[key].history.has_changes() for key in ('starts_at', 'venue_id', 'artist_id')):
+    return
+  for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+    history = state.attrs[key].history
+    recount_shows(connection, model, set(history.deleted or ()) | {getattr(show, key)})
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
 def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
+  date = value if isinstance(value, datetime) else dateutil.parser.parse(value)
   if format == 'full':
     format="EEEE MMMM, d, y 'at' h:mma"
   elif format == 'medium':
@@ -97,58 +357,303 @@ def format_datetime(value, format='medium'):
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+# Answers with 304 when the client's copy is current, otherwise renders the view.
+# Pages with pending flash messages are always rendered so the messages are shown.
+def conditional_response(etag, last_modified, render):
+  not_modified = False
+  if not session.get('_flashes'):
+    if request.if_none_match:
+      not_modified = request.if_none_match.contains(etag)
+    elif request.if_modified_since and last_modified:
+      not_modified = last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=pytz.utc)
+  response = Response(status=304) if not_modified else make_response(render())
+  response.set_etag(etag)
+  if last_modified:
+    response.last_modified = last_modified
+  response.cache_control.no_cache = True
+  return response
+
+def make_etag(*parts):
+  return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+# Validators of a listing: latest update and row count, which also catches deletes
+def listing_validators(model):
+  last_modified, count = db.session.query(func.max(model.updated_at), func.count(model.id)).one()
+  return make_etag(model.__tablename__, last_modified, count), last_modified
+
+# Validators of the venues directory, which also changes when the area summary is refreshed
+def venues_validators():
+  last_modified, count, upcoming = db.session.query(
+    func.max(Venue.updated_at),
+    func.count(Venue.id),
+    db.session.query(func.sum(area_summary.c.upcoming_shows_count)).scalar_subquery()
+  ).one()
+  return make_etag('venue', last_modified, count, upcoming), last_modified
+
+# Validators of the upcoming shows feed, which also changes whenever a show starts
+def shows_validators():
+  now = datetime.utcnow().replace(tzinfo=pytz.utc)
+  last_show, count, last_started, last_venue, last_artist = db.session.query(
+    func.max(Show.updated_at),
+    func.count(Show.id),
+    func.max(Show.starts_at).filter(Show.starts_at < now),
+    db.session.query(func.max(Venue.updated_at)).scalar_subquery(),
+    db.session.query(func.max(Artist.updated_at)).scalar_subquery()
+  ).one()
+  last_modified = max([date for date in (last_show, last_started, last_venue, last_artist) if date is not None], default=None)
+  return make_etag('show', last_show, count, last_started, last_venue, last_artist), last_modified
+
+# Wraps a view so it answers conditional GETs from validators(**view_args) without rendering
+def conditional(validators):
+  def decorator(view):
+    @wraps(view)
+    def wrapper(**kwargs):
+      etag, last_modified = validators(**kwargs)
+      return conditional_response(etag, last_modified, lambda: view(**kwargs))
+    return wrapper
+  return decorator
+
+#----------------------------------------------------------------------------#
+# Access.
+#----------------------------------------------------------------------------#
+
+# Answers the view only to clients in INTERNAL_NETWORKS, anyone else gets a 404
+def internal(view):
+  networks = [ipaddress.ip_network(network.strip()) for network in app.config['INTERNAL_NETWORKS'] if network.strip()]
+  @wraps(view)
+  def wrapper(**kwargs):
+    try:
+      address = ipaddress.ip_address(request.remote_addr or '')
+    except ValueError:
+      abort(404)
+    if not any(address in network for network in networks):
+      abort(404)
+    return view(**kwargs)
+  return wrapper
+
+#----------------------------------------------------------------------------#
+# Queries.
+#
+# Shared by the HTML views and the JSON API.
+#----------------------------------------------------------------------------#
+
+# Column-only listing of venues or artists in id order, narrowed by genre, search term and an after_id cursor
+def owner_rows(model, columns, genre=None, search=None, after_id=None, limit=None):
+  query = db.session.query(*columns)
+  if genre:
+    query = query.filter(model.genres.any(Genre.name == genre))
+  if search:
+    query = query.filter(get_search_engine(db.engine.dialect.name).match(model, search))
+  if after_id is not None:
+    query = query.filter(model.id > after_id)
+  query = query.order_by(model.id)
+  if limit is not None:
+    query = query.limit(limit)
+  return query.all()
+
+# Genre names of the given venues or artists by id, in one query
+def genre_names(model, ids):
+  association = venue_genre if model is Venue else artist_genre
+  owner_id = association.c[model.__tablename__ + '_id']
+  rows = db.session.query(owner_id, Genre.name).join(Genre, Genre.id == association.c.genre_id) \
+    .filter(owner_id.in_(ids)).order_by(owner_id, Genre.name)
+  names = {}
+  for id, name in rows:
+    names.setdefault(id, []).append(name)
+  return names
+
+# Upcoming shows with their venue and artist names in start time order, after an (after_start, after_id) cursor
+def upcoming_shows(after_start=None, after_id=0, limit=None):
+  now = datetime.utcnow().replace(tzinfo=pytz.utc)
+  query = db.session.query(
+    Show.id,
+    Show.starts_at,
+    Show.ends_at,
+    Show.venue_id,
+    Venue.name.label('venue_name'),
+    Show.artist_id,
+    Artist.name.label('artist_name'),
+    Artist.image_link.label('artist_image_link')
+  ).join(Venue, Show.venue_id == Venue.id).join(Artist, Show.artist_id == Artist.id) \
+    .filter(Show.starts_at >= now)
+  if after_start is not None:
+    query = query.filter(or_(Show.starts_at > after_start, and_(Show.starts_at == after_start, Show.id > after_id)))
+  query = query.order_by(Show.starts_at, Show.id)
+  if limit is not None:
+    query = query.limit(limit)
+  return query.all()
+
+# UTC start and end of a show from its form data, a missing end time giving the default duration
+def show_times(data):
+  starts_at = data['start_time'].replace(tzinfo=pytz.utc)
+  ends_at = data['end_time'].replace(tzinfo=pytz.utc) if data.get('end_time') else default_ends_at(starts_at)
+  return starts_at, ends_at
+
+# The show overlapping [starts_at, ends_at) at a venue, found through the (venue_id, starts_at) index
+def conflicting_show(venue_id, starts_at, ends_at):
+  return Show.query.filter(
+    Show.venue_id == venue_id,
+    Show.starts_at > starts_at - MAX_DURATION,
+    Show.starts_at < ends_at,
+    Show.ends_at > starts_at
+  ).order_by(Show.starts_at).first()
+
+# Keys of the (key, venue_id, starts_at, ends_at) bookings overlapping a booked show or each other,
+# reading the booked shows of every venue concerned in one indexed query
+def booking_conflicts(bookings):
+  if not bookings:
+    return set()
+  venue_ids = {venue_id for key, venue_id, starts_at, ends_at in bookings}
+  booked = db.session.query(Show.venue_id, Show.starts_at, Show.ends_at).filter(
+    Show.venue_id.in_(venue_ids),
+    Show.starts_at > min(starts_at for key, venue_id, starts_at, ends_at in bookings) - MAX_DURATION,
+    Show.starts_at < max(ends_at for key, venue_id, starts_at, ends_at in bookings)
+  ).all()
+  return find_conflicts(bookings, booked)
+
+# (starts_at, ends_at) of the shows at a venue overlapping [start, end) in start order, one range
+# scan of the (venue_id, starts_at) index going back at most the longest show duration
+def booked_times(venue_id, start, end):
+  return db.session.execute(
+    select(Show.starts_at, Show.ends_at).where(
+      Show.venue_id == venue_id,
+      Show.starts_at > start - MAX_DURATION,
+      Show.starts_at < end
+    ).order_by(Show.starts_at)
+  ).all()
+
+# Message for a booking refused because of an overlapping show
+def conflict_message(venue_id, show):
+  if show is None:
+    return 'Venue %d is already booked at that time.' % venue_id
+  return 'Venue %d is already booked from %s to %s.' % (venue_id, show.starts_at.strftime('%Y-%m-%d %H:%M'), show.ends_at.strftime('%Y-%m-%d %H:%M'))
+
+# Venue and artist page data through the page cache, None if there is no such row. Misses
+# load from the primary so a lagging replica cannot put a stale page back after an invalidation
+def venue_page(venue_id):
+  return page_cache.get_or_set('venue:%d' % venue_id, lambda: on_primary(load_venue_page, venue_id))
+
+def artist_page(artist_id):
+  return page_cache.get_or_set('artist:%d' % artist_id, lambda: on_primary(load_artist_page, artist_id))
+
+def on_primary(load, *args):
+  with primary(db.session):
+    return load(*args)
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
+# Reads a page size from the query string or form, kept between 1 and maximum
+def page_size(args, name, default, maximum):
+  return max(1, min(args.get(name, default, type=int), maximum))
+
 @app.route('/')
 def index():
   return render_template('pages/home.html')
 
+# Latest update and row count of the venues or artists, which changes with any rename, insert or delete
+def names_version(model):
+  return tuple(db.session.query(func.max(model.updated_at), func.count(model.id)).one())
+
+@app.route('/search/suggest')
+# Returns the venue and artist names starting with q from the in-memory prefix indexes
+def search_suggest():
+  prefix = request.args.get('q', '').strip()
+  limit = page_size(request.args, 'limit', app.config['SUGGESTIONS_LIMIT'], app.config['SUGGESTIONS_LIMIT_MAX'])
+  if not prefix:
+    return jsonify({'venues': [], 'artists': []})
+  venue_suggestions.load(lambda: db.session.query(Venue.id, Venue.name).all(), lambda: names_version(Venue))
+  artist_suggestions.load(lambda: db.session.query(Artist.id, Artist.name).all(), lambda: names_version(Artist))
+  return jsonify({
+    'venues': venue_suggestions.search(prefix, limit),
+    'artists': artist_suggestions.search(prefix, limit)
+  })
+
 #  Venues
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
-# Displays venues by distinct areas
+@conditional(venues_validators)
+# Displays venues by area from the area summary, paginated by area with an (after_state, after_city) cursor
+# and optionally narrowed to one genre with ?genre=
 def venues():
-  data=[]
-  areas = Venue.query.distinct('city', 'state').all()
-  for area in areas:
-    venues = Venue.query.filter(Venue.city == area.city, Venue.state == area.state).all()
-    record = {
-      'city': area.city,
-      'state': area.state,
-      'venues': [venue.get_venue() for venue in venues],
-    }
-    data.append(record)
-  return render_template('pages/venues.html', areas=data)
+  per_page = page_size(request.args, 'per_page', app.config['AREAS_PER_PAGE'], app.config['AREAS_PER_PAGE_MAX'])
+  after_state = request.args.get('after_state')
+  after_city = request.args.get('after_city', '')
+  genre = request.args.get('genre')
+  # Selects the areas for this page from the summary, plus one to know if there is a next page
+  areas = db.session.query(area_summary)
+  if genre:
+    areas = areas.filter(
+      db.session.query(Venue.id)
+      .filter(Venue.state == area_summary.c.state, Venue.city == area_summary.c.city, Venue.genres.any(Genre.name == genre))
+      .exists()
+    )
+  if after_state is not None:
+    areas = areas.filter(or_(area_summary.c.state > after_state, and_(area_summary.c.state == after_state, area_summary.c.city > after_city)))
+  areas = areas.order_by(area_summary.c.state, area_summary.c.city).limit(per_page + 1).subquery()
+  # Fetches the venues of those areas with their area totals in the same statement, already sorted for grouping
+  rows = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, Venue.upcoming_shows_count,
+                          areas.c.venue_count, areas.c.upcoming_shows_count.label('area_upcoming_shows_count'), areas.c.top_genres) \
+    .join(areas, and_(Venue.state == areas.c.state, Venue.city == areas.c.city))
+  if genre:
+    rows = rows.filter(Venue.genres.any(Genre.name == genre))
+  rows = rows.order_by(Venue.state, Venue.city, Venue.id).all()
+  data = []
+  for (state, city), venues in groupby(rows, key=lambda row: (row.state, row.city)):
+    venues = list(venues)
+    data.append({
+      'city': city,
+      'state': state,
+      'venue_count': venues[0].venue_count,
+      'num_upcoming_shows': venues[0].area_upcoming_shows_count,
+      'top_genres': venues[0].top_genres.split(',') if venues[0].top_genres else [],
+      'venues': [{'id': venue.id, 'name': venue.name, 'num_upcoming_shows': venue.upcoming_shows_count} for venue in venues],
+    })
+  next_page = None
+  if len(data) > per_page:
+    data = data[:per_page]
+    next_page = url_for('venues', after_state=data[-1]['state'], after_city=data[-1]['city'], per_page=per_page, genre=genre)
+  return render_template('pages/venues.html', areas=data, next_page=next_page, genre=genre)
 
 @app.route('/venues/search', methods=['POST'])
-# Performs a case-insensitive query and returns the fuzzy-matched venues
+# Performs an indexed case-insensitive substring search, ranked by similarity, with the stored upcoming show counts
 def search_venues():
-  venues_object = Venue.query.filter(Venue.name.ilike(f"%{request.form.get('search_term', '')}%")).all()
+  search_term = request.form.get('search_term', '')
+  limit = page_size(request.form, 'limit', app.config['SEARCH_RESULTS_PER_PAGE'], app.config['SEARCH_RESULTS_PER_PAGE_MAX'])
+  offset = max(request.form.get('offset', 0, type=int), 0)
+  engine = get_search_engine(db.engine.dialect.name)
+  venues_object = db.session.query(Venue.id, Venue.name, Venue.upcoming_shows_count.label('num_upcoming_shows'), func.count().over().label('total')) \
+    .filter(engine.match(Venue, search_term)) \
+    .order_by(*engine.rank(Venue, search_term)) \
+    .limit(limit).offset(offset).all()
   search_object = {
-    'count': len(venues_object),
-    'data': []
-  }
-  for venue in venues_object:
-    shows = Show.query.filter(Show.artist_id == venue.id).all()
-    venue_object = {
+    'count': venues_object[0].total if venues_object else 0,
+    'data': [{
       'id': venue.id,
       'name': venue.name,
-      'num_upcoming_shows': len(shows)
-    }
-    search_object['data'].append(venue_object)
-  return render_template('pages/search_venues.html', results=search_object, search_term=request.form.get('search_term', ''))
+      'num_upcoming_shows': venue.num_upcoming_shows
+    } for venue in venues_object]
+  }
+  next_offset = offset + limit if offset + limit < search_object['count'] else None
+  return render_template('pages/search_venues.html', results=search_object, search_term=search_term, next_offset=next_offset)
 
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-  # Using a full join to capture a venue that has no shows listed
-  venue = Venue.query.join(Venue.shows, full=True).filter(Venue.id == venue_id).first()
+# Assembles the venue page data, or None if there is no such venue
+def load_venue_page(venue_id):
+  # Eager loads the shows and their artists in one round trip, venues without shows still match
+  venue = Venue.query.options(joinedload(Venue.shows).joinedload(Show.artist), selectinload(Venue.genres)).filter(Venue.id == venue_id).first()
+  if venue is None:
+    return None
+  now = datetime.utcnow().replace(tzinfo=pytz.utc)
   venue_object = {
     'id': venue.id,
     'name': venue.name,
-    'genres': venue.genres.split(','),
+    'genres': [genre.name for genre in venue.genres],
     'address': venue.address,
     'city': venue.city,
     'state': venue.state,
@@ -160,24 +665,79 @@ def show_venue(venue_id):
     'seeking_description': venue.seeking_description,
     'past_shows': [],
     'upcoming_shows': [],
-    'upcoming_shows_count': 0
+    'upcoming_shows_count': 0,
+    'past_shows_count': 0
   }
   # This will return the object without show listings if there aren't any
   if venue.shows is not None:
     for show in venue.shows:
-        artist = Artist.query.filter(Artist.id == show.artist_id).first()
+        artist = show.artist
         show_details = {
           'artist_id': artist.id,
           'artist_name':  artist.name,
           'artist_image_link':  artist.image_link,
-          'start_time':  show.start_time
+          'start_time':  show.starts_at,
+          'end_time':  show.ends_at
         }
-        if dateutil.parser.parse(show.start_time) >= datetime.utcnow().replace(tzinfo=pytz.utc):
+        if show.starts_at >= now:
           venue_object['upcoming_shows'].append(show_details)
           venue_object['upcoming_shows_count'] += 1
         else:
           venue_object['past_shows'].append(show_details)
-  return render_template('pages/show_venue.html', venue=venue_object)
+          venue_object['past_shows_count'] += 1
+  # The page changes when the venue, a show or a booked artist is updated, or a show starts
+  venue_object['last_modified'] = max(
+    [venue.updated_at] +
+    [show.updated_at for show in venue.shows] +
+    [show.artist.updated_at for show in venue.shows] +
+    [show.starts_at for show in venue.shows if show.starts_at < now]
+  )
+  venue_object['etag'] = make_etag(venue_object)
+  return venue_object
+
+# Cache keys of a venue page and of the pages of every artist booked there
+def venue_page_keys(venue_id):
+  artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+  return ['venue:%d' % venue_id] + ['artist:%d' % artist_id for artist_id, in artist_ids]
+
+@app.route('/venues/<int:venue_id>')
+# Serves the venue page from the page cache, invalidated by the write handlers, and
+# answers conditional GETs from the validators stored with it
+def show_venue(venue_id):
+  venue_object = venue_page(venue_id)
+  if venue_object is None:
+    abort(404)
+  return conditional_response(venue_object['etag'], venue_object['last_modified'],
+    lambda: render_template('pages/show_venue.html', venue=venue_object))
+
+# Parses an ISO 8601 date or time from the query string as UTC
+def utc_arg(name, default):
+  value = request.args.get(name)
+  if not value:
+    return default
+  return parse_utc(value)
+
+@app.route('/venues/<int:venue_id>/availability')
+# Lists the free windows of a venue between ?from= (default now) and ?to=, read with one
+# range query over its shows merged in a single pass
+def venue_availability(venue_id):
+  try:
+    start = utc_arg('from', utcnow())
+    end = utc_arg('to', start + timedelta(days=app.config['AVAILABILITY_DAYS']))
+  except (ValueError, OverflowError):
+    return json_response({'error': 'from and to must be ISO 8601 dates or times.'}, 400)
+  if not start < end <= start + timedelta(days=app.config['AVAILABILITY_DAYS_MAX']):
+    return json_response({'error': 'to must be after from and at most %d days later.' % app.config['AVAILABILITY_DAYS_MAX']}, 400)
+  booked = booked_times(venue_id, start, end)
+  # Only a venue without shows in range needs looking up
+  if not booked and db.session.get(Venue, venue_id) is None:
+    return json_response({'error': 'Venue not found.'}, 404)
+  return json_response({
+    'venue_id': venue_id,
+    'from': start,
+    'to': end,
+    'free': [{'start': starts_at, 'end': ends_at} for starts_at, ends_at in free_windows(booked, start, end)],
+  })
 
 #  Create Venue
 #  ----------------------------------------------------------------
@@ -185,19 +745,19 @@ def show_venue(venue_id):
 @app.route('/venues/create', methods=['GET'])
 def create_venue_form():
   form = VenueForm()
+  form.genres.choices = Genre.choices()
   return render_template('forms/new_venue.html', form=form)
 
 @app.route('/venues/create', methods=['POST'])
 # Creates a venue and will rollback if not successful
 def create_venue_submission():
   error = False
-  genres = []
   try:
     venue = Venue(name=request.form['name'])
     venue.city = request.form['city']
     venue.state = request.form['state']
     venue.address = request.form['address']
-    venue.genres = ",".join(request.form.getlist('genres'))
+    venue.genres = Genre.by_names(request.form.getlist('genres'))
     venue.phone = request.form['phone']
     if request.form['image_link'] : venue.image_link = request.form['image_link']
     if request.form['facebook_link'] : venue.facebook_link = request.form['facebook_link']
@@ -205,12 +765,16 @@ def create_venue_submission():
     if request.form.getlist('seeking_talent') : venue.seeking_talent = True 
     if request.form['seeking_description'] : venue.seeking_description = request.form['seeking_description']
     db.session.add(venue)
+    db.session.flush()
+    created = (venue.id, venue.name)
     db.session.commit()
+    venue_suggestions.add(*created)
   except:
     error = True
     db.session.rollback()
     app.logger.debug(request.form)
     print(sys.exc_info())
+    count_failure('create', 'venue')
   finally:
     db.session.close()
   if not error:
@@ -225,12 +789,16 @@ def delete_venue(venue_id):
   error = False
   try:
     venue = Venue.query.filter(Venue.id == venue_id).first()
+    stale_pages = venue_page_keys(venue.id)
     db.session.delete(venue)
     db.session.commit()
+    page_cache.invalidate(*stale_pages)
+    venue_suggestions.remove(venue.id)
   except:
     error = True
     db.session.rollback()
     print(sys.exc_info())
+    count_failure('delete', 'venue')
   finally:
     db.session.close()
     venue_response = {"result": f"Venue ID: #{venue_id} has been deleted!"}
@@ -239,36 +807,46 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@conditional(lambda: listing_validators(Artist))
+# Displays all artists, optionally narrowed to one genre with ?genre=
 def artists():
-  artists = Artist.query.all()
-  return render_template('pages/artists.html', artists=artists)
+  genre = request.args.get('genre')
+  artists = owner_rows(Artist, (Artist.id, Artist.name), genre=genre)
+  return render_template('pages/artists.html', artists=artists, genre=genre)
 
 @app.route('/artists/search', methods=['POST'])
-# Performs a case-insensitive query and returns the fuzzy-matched artists
+# Performs an indexed case-insensitive substring search, ranked by similarity, with the stored upcoming show counts
 def search_artists():
-  artists_object = Artist.query.filter(Artist.name.ilike(f"%{request.form.get('search_term', '')}%")).all()
+  search_term = request.form.get('search_term', '')
+  limit = page_size(request.form, 'limit', app.config['SEARCH_RESULTS_PER_PAGE'], app.config['SEARCH_RESULTS_PER_PAGE_MAX'])
+  offset = max(request.form.get('offset', 0, type=int), 0)
+  engine = get_search_engine(db.engine.dialect.name)
+  artists_object = db.session.query(Artist.id, Artist.name, Artist.upcoming_shows_count.label('num_upcoming_shows'), func.count().over().label('total')) \
+    .filter(engine.match(Artist, search_term)) \
+    .order_by(*engine.rank(Artist, search_term)) \
+    .limit(limit).offset(offset).all()
   search_object = {
-    'count': len(artists_object),
-    'data': []
-  }
-  for artist in artists_object:
-    shows = Show.query.filter(Show.artist_id == artist.id).all()
-    artist_object = {
+    'count': artists_object[0].total if artists_object else 0,
+    'data': [{
       'id': artist.id,
       'name': artist.name,
-      'num_upcoming_shows': len(shows)
-    }
-    search_object['data'].append(artist_object)
-  return render_template('pages/search_artists.html', results=search_object, search_term=request.form.get('search_term', ''))
+      'num_upcoming_shows': artist.num_upcoming_shows
+    } for artist in artists_object]
+  }
+  next_offset = offset + limit if offset + limit < search_object['count'] else None
+  return render_template('pages/search_artists.html', results=search_object, search_term=search_term, next_offset=next_offset)
 
-@app.route('/artists/<int:artist_id>')
-# Using a full join to capture a artist that has no shows listed
-def show_artist(artist_id):
-  artist = Artist.query.join(Artist.shows, full=True).filter(Artist.id == artist_id).first()
+# Assembles the artist page data, or None if there is no such artist
+def load_artist_page(artist_id):
+  # Eager loads the shows and their venues in one round trip, artists without shows still match
+  artist = Artist.query.options(joinedload(Artist.shows).joinedload(Show.venue), selectinload(Artist.genres)).filter(Artist.id == artist_id).first()
+  if artist is None:
+    return None
+  now = datetime.utcnow().replace(tzinfo=pytz.utc)
   artist_object = {
     'name': artist.name,
     'id': artist.id,
-    'genres': artist.genres.split(','),
+    'genres': [genre.name for genre in artist.genres],
     'city': artist.city,
     'state': artist.state,
     'phone': artist.phone,
@@ -279,24 +857,50 @@ def show_artist(artist_id):
     'seeking_description': artist.seeking_description,
     'past_shows': [],
     'upcoming_shows': [],
-    'upcoming_shows_count': 0
+    'upcoming_shows_count': 0,
+    'past_shows_count': 0
   }
   # This will return the object without show listings if there aren't any
   if artist.shows is not None:
     for show in artist.shows:
-      venue = Venue.query.filter(Venue.id == show.venue_id).first()
+      venue = show.venue
       show_details = {
         'venue_id': venue.id,
         'venue_name':  venue.name,
         'venue_image_link':  venue.image_link,
-        'start_time':  show.start_time
+        'start_time':  show.starts_at,
+        'end_time':  show.ends_at
       }
-      if dateutil.parser.parse(show.start_time) >= datetime.utcnow().replace(tzinfo=pytz.utc):
+      if show.starts_at >= now:
         artist_object['upcoming_shows'].append(show_details)
         artist_object['upcoming_shows_count'] += 1
       else:
         artist_object['past_shows'].append(show_details)
-  return render_template('pages/show_artist.html', artist=artist_object)
+        artist_object['past_shows_count'] += 1
+  # The page changes when the artist, a show or a booking venue is updated, or a show starts
+  artist_object['last_modified'] = max(
+    [artist.updated_at] +
+    [show.updated_at for show in artist.shows] +
+    [show.venue.updated_at for show in artist.shows] +
+    [show.starts_at for show in artist.shows if show.starts_at < now]
+  )
+  artist_object['etag'] = make_etag(artist_object)
+  return artist_object
+
+# Cache keys of an artist page and of the pages of every venue it is booked at
+def artist_page_keys(artist_id):
+  venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+  return ['artist:%d' % artist_id] + ['venue:%d' % venue_id for venue_id, in venue_ids]
+
+@app.route('/artists/<int:artist_id>')
+# Serves the artist page from the page cache, invalidated by the write handlers, and
+# answers conditional GETs from the validators stored with it
+def show_artist(artist_id):
+  artist_object = artist_page(artist_id)
+  if artist_object is None:
+    abort(404)
+  return conditional_response(artist_object['etag'], artist_object['last_modified'],
+    lambda: render_template('pages/show_artist.html', artist=artist_object))
 
 #  Update
 #  ----------------------------------------------------------------
@@ -304,11 +908,12 @@ def show_artist(artist_id):
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
   form = ArtistForm()
+  form.genres.choices = Genre.choices()
   artist = Artist.query.filter(Artist.id == artist_id).first()
   artist_object = {
     'id': artist.id,
     'name': artist.name,
-    'genres': artist.genres.split(','),
+    'genres': [genre.name for genre in artist.genres],
     'city': artist.city,
     'state': artist.state,
     'phone': artist.phone,
@@ -325,24 +930,27 @@ def edit_artist(artist_id):
 def edit_artist_submission(artist_id):
   artist = Artist.query.filter(Artist.id == artist_id).first()
   error = False
-  genres = []
   try:
     artist.name = request.form['name']
     artist.city = request.form['city']
     artist.state = request.form['state']
-    artist.genres = ",".join(request.form.getlist('genres'))
+    artist.genres = Genre.by_names(request.form.getlist('genres'))
     artist.phone = request.form['phone']
     if request.form['image_link'] : artist.image_link = request.form['image_link']
     if request.form['facebook_link'] : artist.facebook_link = request.form['facebook_link']
     if request.form['website'] : artist.website = request.form['website']
     if request.form.getlist('seeking_venue') : artist.seeking_venue = True 
     if request.form['seeking_description'] : artist.seeking_description = request.form['seeking_description']
+    stale_pages = artist_page_keys(artist_id)
     db.session.commit()
+    page_cache.invalidate(*stale_pages)
+    artist_suggestions.add(artist_id, request.form['name'])
   except:
     error = True
     db.session.rollback()
     app.logger.debug(request.form)
     print(sys.exc_info())
+    count_failure('edit', 'artist')
   finally:
     db.session.close()
   if not error:
@@ -354,11 +962,12 @@ def edit_artist_submission(artist_id):
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id): 
   form = VenueForm()
+  form.genres.choices = Genre.choices()
   venue = Venue.query.filter(Venue.id == venue_id).first()
   venue_object = {
     'id': venue.id,
     'name': venue.name,
-    'genres': venue.genres.split(','),
+    'genres': [genre.name for genre in venue.genres],
     'address': venue.address,
     'city': venue.city,
     'state': venue.state,
@@ -376,25 +985,28 @@ def edit_venue(venue_id):
 def edit_venue_submission(venue_id):
   venue = Venue.query.filter(Venue.id == venue_id).first()
   error = False
-  genres = []
   try:
     venue.name = request.form['name']
     venue.city = request.form['city']
     venue.state = request.form['state']
     venue.address = request.form['address']
-    venue.genres = ",".join(request.form.getlist('genres'))
+    venue.genres = Genre.by_names(request.form.getlist('genres'))
     venue.phone = request.form['phone']
     if request.form['image_link'] : venue.image_link = request.form['image_link']
     if request.form['facebook_link'] : venue.facebook_link = request.form['facebook_link']
     if request.form['website'] : venue.website = request.form['website']
     if request.form.getlist('seeking_talent') : venue.seeking_talent = True 
     if request.form['seeking_description'] : venue.seeking_description = request.form['seeking_description']
+    stale_pages = venue_page_keys(venue_id)
     db.session.commit()
+    page_cache.invalidate(*stale_pages)
+    venue_suggestions.add(venue_id, request.form['name'])
   except:
     error = True
     db.session.rollback()
     app.logger.debug(request.form)
     print(sys.exc_info())
+    count_failure('edit', 'venue')
   finally:
     db.session.close()
   if not error:
@@ -409,18 +1021,18 @@ def edit_venue_submission(venue_id):
 @app.route('/artists/create', methods=['GET'])
 def create_artist_form():
   form = ArtistForm()
+  form.genres.choices = Genre.choices()
   return render_template('forms/new_artist.html', form=form)
 
 @app.route('/artists/create', methods=['POST'])
 # Creates an artist and will rollback if not successful
 def create_artist_submission():
   error = False
-  genres = []
   try:
     artist = Artist(name=request.form['name'])
     artist.city = request.form['city']
     artist.state = request.form['state']
-    artist.genres = ",".join(request.form.getlist('genres'))
+    artist.genres = Genre.by_names(request.form.getlist('genres'))
     artist.phone = request.form['phone']
     if request.form['image_link'] : artist.image_link = request.form['image_link']
     if request.form['facebook_link'] : artist.facebook_link = request.form['facebook_link']
@@ -428,12 +1040,16 @@ def create_artist_submission():
     if request.form.getlist('seeking_venue') : artist.seeking_venue = True 
     if request.form['seeking_description'] : artist.seeking_description = request.form['seeking_description']
     db.session.add(artist)
+    db.session.flush()
+    created = (artist.id, artist.name)
     db.session.commit()
+    artist_suggestions.add(*created)
   except:
     error = True
     db.session.rollback()
     app.logger.debug(request.form)
     print(sys.exc_info())
+    count_failure('create', 'artist')
   finally:
     db.session.close()
   if not error:
@@ -448,12 +1064,16 @@ def delete_artist(artist_id):
   error = False
   try:
     artist = Artist.query.filter(Artist.id == artist_id).first()
+    stale_pages = artist_page_keys(artist.id)
     db.session.delete(artist)
     db.session.commit()
+    page_cache.invalidate(*stale_pages)
+    artist_suggestions.remove(artist.id)
   except:
     error = True
     db.session.rollback()
     print(sys.exc_info())
+    count_failure('delete', 'artist')
   finally:
     db.session.close()
   artist_response = {"result": f"Artist ID: #{artist_id} has been deleted!"}
@@ -463,24 +1083,26 @@ def delete_artist(artist_id):
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@conditional(shows_validators)
+# Displays only upcoming shows by start time, paginated with an (after_start, after_id) cursor
 def shows():
-  shows = Show.query.all()
-  shows_object = []
-  for show in shows:
-    # Displays only upcoming shows and omits past shows
-    if dateutil.parser.parse(show.start_time) >= datetime.utcnow().replace(tzinfo=pytz.utc):
-      artist = Artist.query.filter(Artist.id == show.artist_id).first()
-      venue = Venue.query.filter(Venue.id == show.venue_id).first()
-      show_object = {
-        'venue_id': show.venue_id,
-        'venue_name': venue.name,
-        'artist_id': artist.id,
-        'artist_name': artist.name,
-        'artist_image_link': artist.image_link,
-        'start_time': show.start_time
-      }
-      shows_object.append(show_object)
-  return render_template('pages/shows.html', shows=shows_object)
+  per_page = page_size(request.args, 'per_page', app.config['SHOWS_PER_PAGE'], app.config['SHOWS_PER_PAGE_MAX'])
+  after_start = request.args.get('after_start', type=parse_utc)
+  after_id = request.args.get('after_id', 0, type=int)
+  rows = upcoming_shows(after_start, after_id, per_page + 1)
+  shows_object = [{
+    'venue_id': row.venue_id,
+    'venue_name': row.venue_name,
+    'artist_id': row.artist_id,
+    'artist_name': row.artist_name,
+    'artist_image_link': row.artist_image_link,
+    'start_time': row.starts_at
+  } for row in rows[:per_page]]
+  next_page = None
+  if len(rows) > per_page:
+    last = rows[per_page - 1]
+    next_page = url_for('shows', after_start=last.starts_at.isoformat(), after_id=last.id, per_page=per_page)
+  return render_template('pages/shows.html', shows=shows_object, next_page=next_page)
 
 @app.route('/shows/create')
 def create_shows():
@@ -491,26 +1113,345 @@ def create_shows():
 # Creates a show and will rollback if not successful
 def create_show_submission():
   error = False
+  conflict = None
   try:
-    start_time = datetime.strptime(request.form['start_time'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=pytz.utc).isoformat()
-    show = Show(start_time=start_time)
+    end_time = request.form.get('end_time')
+    starts_at, ends_at = show_times({
+      'start_time': datetime.strptime(request.form['start_time'], '%Y-%m-%d %H:%M:%S'),
+      'end_time': datetime.strptime(end_time, '%Y-%m-%d %H:%M:%S') if end_time else None
+    })
+    if not starts_at < ends_at <= starts_at + MAX_DURATION:
+      raise ValueError('Invalid show duration')
+    show = Show(starts_at=starts_at, ends_at=ends_at)
     show.venue_id = request.form['venue_id']
     show.artist_id = request.form['artist_id']
     db.session.add(show)
     db.session.commit()
+    page_cache.invalidate('venue:%d' % int(request.form['venue_id']), 'artist:%d' % int(request.form['artist_id']))
   except:
     error = True
     db.session.rollback()
+    # The database refused an overlapping booking, find out which show holds the slot
+    if is_overlap_error(sys.exc_info()[1]):
+      venue_id = int(request.form['venue_id'])
+      conflict = conflict_message(venue_id, conflicting_show(venue_id, starts_at, ends_at))
     app.logger.debug(request.form)
     print(sys.exc_info())
+    count_failure('create', 'show')
   finally:
     db.session.close()
   if not error:
     flash('Show for artist ' + request.form['artist_id'] + ' at venue ' + request.form['venue_id'] + ' was successfully listed!')
+  elif conflict:
+    flash(conflict + ' The show could not be listed.')
   else:
     flash('An error occurred. Show for artist ' + request.form['artist_id'] + ' at venue ' + request.form['venue_id'] + ' could not be listed.')
   return render_template('pages/home.html')
 
+#  Export
+#  ----------------------------------------------------------------
+
+# Exported columns, named like the import expects them
+EXPORT_COLUMNS = {
+  'venues': ('id', 'name', 'city', 'state', 'address', 'phone', 'image_link', 'genres', 'facebook_link', 'website', 'seeking_talent', 'seeking_description'),
+  'artists': ('id', 'name', 'city', 'state', 'phone', 'image_link', 'genres', 'facebook_link', 'website', 'seeking_venue', 'seeking_description'),
+  'shows': ('id', 'venue_id', 'artist_id', 'start_time', 'end_time'),
+}
+
+# Yields one dict per row read through a server-side cursor, venues and artists have
+# their genres joined in id order and folded back into a list as the rows stream by
+def export_records(kind):
+  yield_per = app.config['EXPORT_YIELD_PER']
+  if kind == 'shows':
+    query = select(Show.id, Show.venue_id, Show.artist_id, Show.starts_at, Show.ends_at).order_by(Show.id)
+    for row in db.session.execute(query.execution_options(yield_per=yield_per)):
+      yield {
+        'id': row.id,
+        'venue_id': row.venue_id,
+        'artist_id': row.artist_id,
+        # In the format the show form and the import read back
+        'start_time': row.starts_at.strftime('%Y-%m-%d %H:%M:%S') if row.starts_at else None,
+        'end_time': row.ends_at.strftime('%Y-%m-%d %H:%M:%S'),
+      }
+    return
+  model, association = (Venue, venue_genre) if kind == 'venues' else (Artist, artist_genre)
+  table = model.__table__
+  link = association.c[model.__tablename__ + '_id']
+  query = select(*[table.c[name] for name in EXPORT_COLUMNS[kind] if name != 'genres'], Genre.name.label('genre')) \
+    .select_from(table.outerjoin(association, link == table.c.id).outerjoin(Genre, Genre.id == association.c.genre_id)) \
+    .order_by(table.c.id, Genre.name)
+  rows = db.session.execute(query.execution_options(yield_per=yield_per))
+  for id, group in groupby(rows, key=lambda row: row.id):
+    genres = []
+    for row in group:
+      if row.genre is not None:
+        genres.append(row.genre)
+    record = dict(row._mapping)
+    del record['genre']
+    record['genres'] = genres
+    yield record
+
+@app.route('/export/<any(venues, artists, shows):kind>')
+@internal
+# Streams a whole table as CSV, or JSONL with ?format=jsonl, in a chunked response. The
+# tables hold contact details, so only clients in INTERNAL_NETWORKS are answered.
+def export(kind):
+  file_format = request.args.get('format', 'csv')
+  if file_format not in EXPORT_MIMETYPES:
+    abort(400)
+  chunks = export_chunks(export_records(kind), EXPORT_COLUMNS[kind], file_format, app.config['EXPORT_YIELD_PER'])
+  response = Response(stream_with_context(chunks), mimetype=EXPORT_MIMETYPES[file_format])
+  response.headers['Content-Disposition'] = 'attachment; filename=%s.%s' % (kind, file_format)
+  return response
+
+#----------------------------------------------------------------------------#
+# JSON API.
+#
+# Version 1 of the JSON API, reading through the same queries and page
+# cache as the HTML views and creating records with the same forms.
+#----------------------------------------------------------------------------#
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Fields a listing or show feed can select with ?fields=, listings default to API_LIST_FIELDS
+VENUE_API_FIELDS = ('id', 'name', 'city', 'state', 'address', 'phone', 'image_link', 'facebook_link', 'website',
+                    'seeking_talent', 'seeking_description', 'genres', 'upcoming_shows_count', 'past_shows_count',
+                    'next_show_at', 'updated_at')
+ARTIST_API_FIELDS = ('id', 'name', 'city', 'state', 'phone', 'image_link', 'facebook_link', 'website',
+                     'seeking_venue', 'seeking_description', 'genres', 'upcoming_shows_count', 'past_shows_count',
+                     'next_show_at', 'updated_at')
+API_LIST_FIELDS = ('id', 'name', 'city', 'state')
+SHOW_API_FIELDS = ('id', 'venue_id', 'venue_name', 'artist_id', 'artist_name', 'artist_image_link', 'start_time', 'end_time')
+
+@api.errorhandler(ApiError)
+def api_error(error):
+  return json_response({'error': error.message}, error.status)
+
+def api_limit():
+  return max(min(request.args.get('limit', app.config['API_PAGE_SIZE'], type=int), app.config['API_PAGE_SIZE_MAX']), 1)
+
+def api_json_body():
+  body = request.get_json(silent=True)
+  if not isinstance(body, dict):
+    raise ApiError(400, 'Expected a JSON object.')
+  return body
+
+# Lists venues or artists in id order, loading only the columns of the requested fields
+def api_owner_listing(model, allowed):
+  fields = parse_fields(request.args.get('fields'), allowed, API_LIST_FIELDS)
+  limit = api_limit()
+  after_id = None
+  if request.args.get('cursor'):
+    after_id, = decode_cursor(request.args['cursor'], 1)
+    if not isinstance(after_id, int):
+      raise ApiError(400, 'Invalid cursor.')
+  columns = [model.id] + [getattr(model, field) for field in fields if field not in ('id', 'genres')]
+  rows = owner_rows(model, columns, genre=request.args.get('genre'), search=request.args.get('q'), after_id=after_id, limit=limit + 1)
+  next_cursor = encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+  rows = rows[:limit]
+  genres = genre_names(model, [row.id for row in rows]) if 'genres' in fields and rows else {}
+  data = [{field: genres.get(row.id, []) if field == 'genres' else getattr(row, field) for field in fields} for row in rows]
+  return json_response({'data': data, 'next_cursor': next_cursor})
+
+# Serves a venue or artist page from the page cache, narrowed to ?fields=
+def api_owner_page(page, name):
+  if page is None:
+    raise ApiError(404, '%s not found.' % name)
+  allowed = [key for key in page if key not in ('etag', 'last_modified')]
+  fields = parse_fields(request.args.get('fields'), allowed, allowed)
+  return conditional_response(page['etag'], page['last_modified'],
+    lambda: json_response({'data': {field: page[field] for field in fields}}))
+
+# Creates a venue or artist from a JSON object validated by its form, like the create views
+def api_create_owner(model, form_class, suggestions):
+  validate = RowValidator(form_class, choices={'genres': Genre.choices()}, multiple=('genres',), checkboxes=('seeking_talent', 'seeking_venue'))
+  data, errors = validate(api_json_body())
+  if errors:
+    return json_response({'errors': errors}, 400)
+  values = venue_values if model is Venue else artist_values
+  error = False
+  try:
+    owner = model(genres=Genre.by_names(data['genres']), **values(data, utcnow()))
+    db.session.add(owner)
+    db.session.flush()
+    created = (owner.id, owner.name)
+    db.session.commit()
+    suggestions.add(*created)
+  except:
+    error = True
+    db.session.rollback()
+    print(sys.exc_info())
+    count_failure('create', model.__tablename__)
+  finally:
+    db.session.close()
+  if error:
+    raise ApiError(500, '%s could not be created.' % data['name'])
+  return json_response({'data': {'id': created[0], 'name': created[1]}}, 201)
+
+@api.route('/venues')
+@conditional(lambda: listing_validators(Venue))
+# Lists venues with ?fields=, ?genre=, ?q=, ?limit= and the ?cursor= of the previous page
+def api_venues():
+  return api_owner_listing(Venue, VENUE_API_FIELDS)
+
+@api.route('/venues/<int:venue_id>')
+def api_venue(venue_id):
+  return api_owner_page(venue_page(venue_id), 'Venue')
+
+@api.route('/venues', methods=['POST'])
+def api_create_venue():
+  return api_create_owner(Venue, VenueForm, venue_suggestions)
+
+@api.route('/artists')
+@conditional(lambda: listing_validators(Artist))
+# Lists artists with ?fields=, ?genre=, ?q=, ?limit= and the ?cursor= of the previous page
+def api_artists():
+  return api_owner_listing(Artist, ARTIST_API_FIELDS)
+
+@api.route('/artists/<int:artist_id>')
+def api_artist(artist_id):
+  return api_owner_page(artist_page(artist_id), 'Artist')
+
+@api.route('/artists', methods=['POST'])
+def api_create_artist():
+  return api_create_owner(Artist, ArtistForm, artist_suggestions)
+
+@api.route('/shows')
+@conditional(shows_validators)
+# Lists upcoming shows in start time order with ?fields=, ?limit= and the ?cursor= of the previous page
+def api_shows():
+  fields = parse_fields(request.args.get('fields'), SHOW_API_FIELDS, SHOW_API_FIELDS)
+  limit = api_limit()
+  after_start, after_id = None, 0
+  if request.args.get('cursor'):
+    after_start, after_id = decode_cursor(request.args['cursor'], 2)
+    try:
+      after_start = parse_utc(after_start)
+    except (TypeError, ValueError, OverflowError):
+      raise ApiError(400, 'Invalid cursor.')
+  rows = upcoming_shows(after_start, after_id, limit + 1)
+  next_cursor = encode_cursor(rows[limit - 1].starts_at, rows[limit - 1].id) if len(rows) > limit else None
+  columns = {'start_time': 'starts_at', 'end_time': 'ends_at'}
+  data = [{field: getattr(row, columns.get(field, field)) for field in fields} for row in rows[:limit]]
+  return json_response({'data': data, 'next_cursor': next_cursor})
+
+@api.route('/shows', methods=['POST'])
+# Creates a show from a JSON object validated by the show form, like create_show_submission
+def api_create_show():
+  data, errors = RowValidator(ShowForm)(api_json_body())
+  if not errors:
+    errors = missing_show_references([(0, data)]).get(0)
+  if errors:
+    return json_response({'errors': errors}, 400)
+  error = False
+  conflict = None
+  starts_at, ends_at = show_times(data)
+  venue_id = int(data['venue_id'])
+  try:
+    show = Show(starts_at=starts_at, ends_at=ends_at)
+    show.venue_id = venue_id
+    show.artist_id = int(data['artist_id'])
+    db.session.add(show)
+    db.session.flush()
+    show_id = show.id
+    db.session.commit()
+    page_cache.invalidate('venue:%d' % venue_id, 'artist:%d' % int(data['artist_id']))
+  except:
+    error = True
+    db.session.rollback()
+    if is_overlap_error(sys.exc_info()[1]):
+      conflict = conflict_message(venue_id, conflicting_show(venue_id, starts_at, ends_at))
+    print(sys.exc_info())
+    count_failure('create', 'show')
+  finally:
+    db.session.close()
+  if conflict:
+    raise ApiError(409, conflict)
+  if error:
+    raise ApiError(500, 'Show could not be created.')
+  return json_response({'data': {'id': show_id}}, 201)
+
+@api.route('/shows/batch', methods=['POST'])
+# Creates a JSON array of shows in one transaction. Every item is validated by the show form,
+# all venue and artist ids are checked in one query and the bookings against each other and the
+# booked shows in another, then the valid shows are bulk inserted. Answers 201 when all were
+# created, 207 when some were and 400 when none were, with one result per item in request order.
+def api_create_shows():
+  items = request.get_json(silent=True)
+  if not isinstance(items, list):
+    raise ApiError(400, 'Expected a JSON array.')
+  if len(items) > app.config['API_BATCH_MAX']:
+    raise ApiError(413, 'At most %d shows per batch.' % app.config['API_BATCH_MAX'])
+  results = [None] * len(items)
+  validate = RowValidator(ShowForm)
+  valid = []
+  for index, item in enumerate(items):
+    if not isinstance(item, dict):
+      results[index] = {'status': 400, 'errors': {'item': ['Expected a JSON object.']}}
+      continue
+    data, errors = validate(item)
+    if errors:
+      results[index] = {'status': 400, 'errors': errors}
+    else:
+      valid.append((index, data))
+  missing = missing_show_references(valid)
+  for index, errors in missing.items():
+    results[index] = {'status': 400, 'errors': errors}
+  valid = [(index, data) for index, data in valid if index not in missing]
+  conflicts = booking_conflicts([(index, int(data['venue_id'])) + show_times(data) for index, data in valid])
+  for index in conflicts:
+    results[index] = {'status': 409, 'errors': {'start_time': ['Venue %d is already booked at that time.' % int(items[index]['venue_id'])]}}
+  valid = [(index, data) for index, data in valid if index not in conflicts]
+  if valid:
+    error = False
+    conflict = False
+    try:
+      ids, stale_pages = insert_shows(db.session.connection(), [data for index, data in valid])
+      db.session.info['areas_changed'] = True
+      db.session.commit()
+      page_cache.invalidate(*stale_pages)
+    except:
+      error = True
+      db.session.rollback()
+      conflict = is_overlap_error(sys.exc_info()[1])
+      print(sys.exc_info())
+      count_failure('create', 'show')
+    finally:
+      db.session.close()
+    # A show booked concurrently took one of the slots, nothing was inserted
+    if conflict:
+      raise ApiError(409, 'A venue was booked concurrently, no show was created.')
+    if error:
+      raise ApiError(500, 'Shows could not be created.')
+    for (index, data), id in zip(valid, ids):
+      results[index] = {'status': 201, 'id': id}
+  created = len(valid)
+  status = 201 if created == len(items) else 207 if created else 400
+  return json_response({'created': created, 'rejected': len(items) - created, 'results': results}, status)
+
+app.register_blueprint(api)
+
+#----------------------------------------------------------------------------#
+# Internal.
+#
+# Operational endpoints, only answered to clients in INTERNAL_NETWORKS.
+#----------------------------------------------------------------------------#
+
+@app.route('/internal/pool')
+@internal
+# Reports the connections of this worker's pool and how long checkouts waited for one
+def internal_pool():
+  return json_response({'database': pool_stats(db.engine.pool, app.config['DATABASE_MAX_OVERFLOW'])})
+
+@app.route('/metrics')
+@internal
+# Prometheus scrape of the request, pool, cache and failure metrics of every worker
+def prometheus_metrics():
+  if metrics is None:
+    abort(404)
+  body, content_type = metrics.exposition()
+  return Response(body, content_type=content_type)
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -520,20 +1461,230 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
+# Queue and writer thread of the app logger, set up by configure_logging()
+log_queue = None
+
+# Moves the app logger onto a queue written out by a background thread, to stderr and
+# outside debug mode to the log file as well. Called by configure(), only the first call acts.
+def configure_logging():
+  global log_queue
+  if log_queue is not None:
+    return
+  stream_handler = logging.StreamHandler()
+  stream_handler.setFormatter(default_handler.formatter)
+  handlers = [stream_handler]
+  if not app.debug:
+    file_handler = FileHandler(app.config['ERROR_LOG'], delay=True)
     file_handler.setFormatter(
         Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
     )
     app.logger.setLevel(logging.INFO)
     file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+    handlers.append(file_handler)
+  log_queue = LogQueue(handlers, app.config['LOG_QUEUE_SIZE'])
+  app.logger.removeHandler(default_handler)
+  app.logger.addHandler(log_queue.handler)
+  log_queue.start()
+  if metrics is not None:
+    metrics.watch_log_queue(log_queue)
+  app.logger.info('errors')
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@app.cli.command('recount-shows')
+@click.option('--batch-size', default=1000, show_default=True, help='Venues or artists recounted per transaction.')
+@click.option('--all', 'recount_all', is_flag=True, help='Recount every venue and artist, not only those whose next show has started.')
+# Rolls shows that have started from the upcoming to the past counters, meant to run on a schedule
+def recount_shows_command(batch_size, recount_all):
+  for model in (Venue, Artist):
+    last_id = 0
+    total = 0
+    while True:
+      query = db.session.query(model.id).filter(model.id > last_id)
+      if not recount_all:
+        query = query.filter(model.next_show_at < utcnow())
+      ids = [id for id, in query.order_by(model.id).limit(batch_size)]
+      if not ids:
+        break
+      recount_shows(db.session.connection(), model, ids)
+      db.session.commit()
+      last_id = ids[-1]
+      total += len(ids)
+      click.echo(f'{model.__tablename__}: {total} recounted')
+    click.echo(f'{model.__tablename__}: done, {total} recounted')
+  # The upcoming counts have moved, so the Postgres area summary follows
+  refresh_area_summary(db.session.connection())
+  db.session.commit()
+
+@app.cli.command('refresh-areas')
+# Refreshes the Postgres area summary concurrently, meant to run on a schedule
+def refresh_areas_command():
+  refresh_area_summary(db.session.connection())
+  db.session.commit()
+  click.echo('area_summary refreshed')
+
+#  Import
+#  ----------------------------------------------------------------
+
+# Column values of validated venue and artist form data, optional links are left to their defaults like the create views do
+def venue_values(data, now):
+  values = {'name': data['name'], 'city': data['city'], 'state': data['state'], 'address': data['address'],
+            'phone': data['phone'], 'seeking_talent': data['seeking_talent'], 'updated_at': now}
+  for field in ('image_link', 'facebook_link', 'website', 'seeking_description'):
+    if data[field]:
+      values[field] = data[field]
+  return values
+
+def artist_values(data, now):
+  values = {'name': data['name'], 'city': data['city'], 'state': data['state'], 'phone': data['phone'],
+            'seeking_venue': data['seeking_venue'], 'updated_at': now}
+  for field in ('image_link', 'facebook_link', 'website', 'seeking_description'):
+    if data[field]:
+      values[field] = data[field]
+  return values
+
+# Writes venues or artists and their genre links, returning the page cache keys made stale like every writer here
+def import_owners(connection, model, association, rows, genre_ids):
+  now = utcnow()
+  owner_key = model.__tablename__ + '_id'
+  values = venue_values if model is Venue else artist_values
+  ids = insert_rows(connection, model.__table__, [values(data, now) for data in rows], return_ids=True)
+  links = [{owner_key: id, 'genre_id': genre_ids[name]} for id, data in zip(ids, rows) for name in set(data['genres'])]
+  if links:
+    insert_rows(connection, association, links)
+  # New rows have no cached pages to invalidate
+  return []
+
+# Writes shows with both start columns, then recounts the counters the Show events would have kept.
+# Returns the new show ids in order and the page cache keys made stale.
+def insert_shows(connection, shows):
+  now = utcnow()
+  rows = []
+  for data in shows:
+    starts_at, ends_at = show_times(data)
+    rows.append({'venue_id': int(data['venue_id']), 'artist_id': int(data['artist_id']), 'starts_at': starts_at,
+                 'ends_at': ends_at, 'start_time': starts_at.isoformat(), 'updated_at': now})
+  ids = insert_rows(connection, Show.__table__, rows, return_ids=True)
+  venue_ids = sorted({row['venue_id'] for row in rows})
+  artist_ids = sorted({row['artist_id'] for row in rows})
+  recount_shows(connection, Venue, venue_ids)
+  recount_shows(connection, Artist, artist_ids)
+  return ids, ['venue:%d' % id for id in venue_ids] + ['artist:%d' % id for id in artist_ids]
+
+# Rejects the shows whose venue or artist does not exist, checking every id of the batch in one query
+def missing_show_references(rows):
+  errors = {}
+  ids = {'venue_id': set(), 'artist_id': set()}
+  for key, data in rows:
+    for field in ids:
+      try:
+        ids[field].add(int(data[field]))
+      except ValueError:
+        errors.setdefault(key, {})[field] = ['Not a valid id.']
+  existing = {'venue_id': set(), 'artist_id': set()}
+  references = select(literal('venue_id').label('field'), Venue.id).where(Venue.id.in_(ids['venue_id'])) \
+    .union_all(select(literal('artist_id'), Artist.id).where(Artist.id.in_(ids['artist_id'])))
+  for field, id in db.session.execute(references):
+    existing[field].add(id)
+  for key, data in rows:
+    for field in ids:
+      if key not in errors and int(data[field]) not in existing[field]:
+        errors.setdefault(key, {})[field] = ['No such %s.' % field[:-3]]
+  return errors
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl']), help='Input format, guessed from the file extension by default.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows written per transaction.')
+@click.option('--errors', 'errors_path', default='import-errors.jsonl', show_default=True, help='JSONL file receiving the rejected rows.')
+# Streams venues, artists or shows from CSV or JSONL, validated like the create forms and written in batches
+def import_command(kind, source, file_format, batch_size, errors_path):
+  file_format = file_format or ('jsonl' if source.name.endswith(('.jsonl', '.json')) else 'csv')
+  genre_ids = dict(db.session.query(Genre.name, Genre.id))
+  choices = {'genres': [(name, name) for name in sorted(genre_ids)]}
+  if kind == 'shows':
+    validate = RowValidator(ShowForm)
+    write = lambda connection, rows: insert_shows(connection, rows)[1]
+  else:
+    model, association = (Venue, venue_genre) if kind == 'venues' else (Artist, artist_genre)
+    validate = RowValidator(VenueForm if kind == 'venues' else ArtistForm, choices=choices,
+                            multiple=('genres',), checkboxes=('seeking_talent', 'seeking_venue'))
+    write = lambda connection, rows: import_owners(connection, model, association, rows, genre_ids)
+  read = imported = 0
+  started = time.monotonic()
+  with open(errors_path, 'w', encoding='utf-8') as errors_file:
+    error_log = ErrorLog(errors_file)
+    for batch in batches(read_rows(source, file_format), batch_size):
+      read += len(batch)
+      valid = []
+      for line_number, row in batch:
+        data, errors = validate(row)
+        if errors:
+          error_log.write(line_number, row, errors)
+        else:
+          valid.append((line_number, row, data))
+      if kind == 'shows':
+        missing = missing_show_references([(line_number, data) for line_number, row, data in valid])
+        for line_number, row, data in valid:
+          if line_number in missing:
+            error_log.write(line_number, row, missing[line_number])
+        valid = [item for item in valid if item[0] not in missing]
+        conflicts = booking_conflicts([(line_number, int(data['venue_id'])) + show_times(data) for line_number, row, data in valid])
+        for line_number, row, data in valid:
+          if line_number in conflicts:
+            error_log.write(line_number, row, {'start_time': ['The venue is already booked at that time.']})
+        valid = [item for item in valid if item[0] not in conflicts]
+      try:
+        stale_pages = write(db.session.connection(), [data for line_number, row, data in valid])
+        db.session.commit()
+        imported += len(valid)
+      except Exception:
+        db.session.rollback()
+        # Retries the batch row by row so a database error only rejects the rows causing it
+        stale_pages = []
+        for line_number, row, data in valid:
+          try:
+            stale_pages += write(db.session.connection(), [data])
+            db.session.commit()
+            imported += 1
+          except Exception as error:
+            db.session.rollback()
+            error_log.write(line_number, row, {'database': [str(getattr(error, 'orig', None) or error)]})
+      page_cache.invalidate(*stale_pages)
+      click.echo('%s: %d read, %d imported, %d rejected, %.0f rows/s' % (kind, read, imported, error_log.count, read / max(time.monotonic() - started, 1e-6)))
+  if kind != 'shows':
+    (venue_suggestions if kind == 'venues' else artist_suggestions).invalidate()
+  if kind != 'artists':
+    refresh_area_summary(db.session.connection())
+    db.session.commit()
+  click.echo('%s: done, %d imported, %d rejected%s' % (kind, imported, error_log.count, ', see ' + errors_path if error_log.count else ''))
+
+@app.cli.command('export')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl']), default='csv', show_default=True)
+@click.option('--output', type=click.File('w', encoding='utf-8'), default='-', help='File to write, stdout by default.')
+# Writes the same stream as /export/<kind>, in a format `flask import` reads back
+def export_command(kind, file_format, output):
+  for chunk in export_chunks(export_records(kind), EXPORT_COLUMNS[kind], file_format, app.config['EXPORT_YIELD_PER']):
+    output.write(chunk)
 
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
+# Entry point of the WSGI server, e.g. `gunicorn --preload --workers 8 'app:configure()'`
+# with FLASK_ENV=production. It is not a factory: the app is the module's single `app`,
+# built on import, and configure() only finishes its process-wide setup (the log queue)
+# and returns it. It is idempotent, later calls return the same app untouched. Importing
+# this module opens no database connection and no file, so a pre-fork server can load it
+# once and fork its workers from the loaded app.
+def configure():
+  configure_logging()
+  return app
+
 # Default port:
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    configure().run()
\ No newline at end of file
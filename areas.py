@@ -0,0 +1,97 @@
+#----------------------------------------------------------------------------#
+# Area summary.
+#
+# One row per (state, city) with the number of venues, their upcoming shows
+# and the most common genres, read by the /venues directory. On Postgres it
+# is a materialized view refreshed concurrently by `flask refresh-areas` on a
+# schedule, or after each write when AREA_SUMMARY_REFRESH_ON_WRITE is set.
+# SQLite has no materialized views, so it is a table kept current by
+# triggers that recompute the affected areas inside the writing transaction.
+#----------------------------------------------------------------------------#
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, Text, event, text
+
+# Genres listed per area, most common first
+TOP_GENRES = 3
+
+# Not part of the models metadata so db.create_all() never makes it a table
+area_summary = Table('area_summary', MetaData(),
+  Column('state', String(120), primary_key=True),
+  Column('city', String(120), primary_key=True),
+  Column('venue_count', Integer, nullable=False),
+  Column('upcoming_shows_count', Integer, nullable=False),
+  Column('top_genres', Text),
+)
+
+def summary_select(dialect_name, where=''):
+  # Aggregates the venues matching where into one row per area
+  if dialect_name == 'postgresql':
+    genres = "string_agg(top.name, ',' ORDER BY top.venues DESC, top.name)"
+  else:
+    genres = "group_concat(top.name, ',')"
+  return (
+    "SELECT venue.state AS state, venue.city AS city, COUNT(*) AS venue_count, "
+    "SUM(venue.upcoming_shows_count) AS upcoming_shows_count, "
+    f"(SELECT {genres} FROM (SELECT genre.name AS name, COUNT(*) AS venues FROM venue_genre "
+    "JOIN genre ON genre.id = venue_genre.genre_id "
+    "JOIN venue AS area_venue ON area_venue.id = venue_genre.venue_id "
+    "WHERE area_venue.state = venue.state AND area_venue.city = venue.city "
+    f"GROUP BY genre.name ORDER BY venues DESC, genre.name LIMIT {TOP_GENRES}) AS top) AS top_genres "
+    f"FROM venue {where} GROUP BY venue.state, venue.city"
+  )
+
+#----------------------------------------------------------------------------#
+# Schema.
+#----------------------------------------------------------------------------#
+
+def sqlite_refresh_area(state, city):
+  # Trigger body statements recomputing the single area (state, city)
+  return (
+    f"DELETE FROM area_summary WHERE state = {state} AND city = {city}; "
+    "INSERT INTO area_summary (state, city, venue_count, upcoming_shows_count, top_genres) "
+    f"{summary_select('sqlite', f'WHERE venue.state = {state} AND venue.city = {city}')}; "
+  )
+
+def area_summary_ddl(dialect_name):
+  if dialect_name == 'postgresql':
+    return [
+      f"CREATE MATERIALIZED VIEW IF NOT EXISTS area_summary AS {summary_select(dialect_name)}",
+      # REFRESH ... CONCURRENTLY needs a unique index on the view
+      "CREATE UNIQUE INDEX IF NOT EXISTS ix_area_summary_state_city ON area_summary (state, city)",
+    ]
+  venue_area = lambda row: (
+    f"(SELECT state FROM venue WHERE id = {row}.venue_id)",
+    f"(SELECT city FROM venue WHERE id = {row}.venue_id)",
+  )
+  return [
+    "CREATE TABLE IF NOT EXISTS area_summary (state VARCHAR(120) NOT NULL, city VARCHAR(120) NOT NULL, "
+    "venue_count INTEGER NOT NULL, upcoming_shows_count INTEGER NOT NULL, top_genres TEXT, "
+    "PRIMARY KEY (state, city))",
+    "CREATE TRIGGER IF NOT EXISTS area_summary_venue_ai AFTER INSERT ON venue BEGIN "
+    f"{sqlite_refresh_area('new.state', 'new.city')}END",
+    "CREATE TRIGGER IF NOT EXISTS area_summary_venue_ad AFTER DELETE ON venue BEGIN "
+    f"{sqlite_refresh_area('old.state', 'old.city')}END",
+    "CREATE TRIGGER IF NOT EXISTS area_summary_venue_au AFTER UPDATE OF state, city, upcoming_shows_count ON venue BEGIN "
+    f"{sqlite_refresh_area('old.state', 'old.city')}{sqlite_refresh_area('new.state', 'new.city')}END",
+    "CREATE TRIGGER IF NOT EXISTS area_summary_genre_ai AFTER INSERT ON venue_genre BEGIN "
+    f"{sqlite_refresh_area(*venue_area('new'))}END",
+    "CREATE TRIGGER IF NOT EXISTS area_summary_genre_ad AFTER DELETE ON venue_genre BEGIN "
+    f"{sqlite_refresh_area(*venue_area('old'))}END",
+    "DELETE FROM area_summary",
+    f"INSERT INTO area_summary (state, city, venue_count, upcoming_shows_count, top_genres) {summary_select(dialect_name)}",
+  ]
+
+def create_area_summary(target, connection, **kw):
+  if connection.dialect.name not in ('postgresql', 'sqlite'):
+    return
+  for statement in area_summary_ddl(connection.dialect.name):
+    connection.execute(text(statement))
+
+def refresh_area_summary(connection):
+  # Rebuilds the Postgres view without blocking readers, SQLite is always current
+  if connection.dialect.name == 'postgresql':
+    connection.execute(text('REFRESH MATERIALIZED VIEW CONCURRENTLY area_summary'))
+
+def register(metadata):
+  # Creates the summary alongside the models on db.create_all()
+  event.listen(metadata, 'after_create', create_area_summary)
@@ -0,0 +1,156 @@
+#----------------------------------------------------------------------------#
+# ASGI read path.
+#
+# Serves the read-only views (the venue, artist and show listings, the
+# venue and artist pages and venue availability) from an asyncio event
+# loop, so one process holds many concurrent slow clients while their
+# queries wait on the database. The views, models and templates are the
+# ones of app.py: each view runs through AsyncSession.run_sync, with
+# db.session swapped for a session whose round trips are awaited on the
+# async engine (asyncpg on Postgres, aiosqlite on SQLite) instead of
+# blocking a worker. Rendering still runs on the loop, it is short next to
+# the queries.
+#
+#   uvicorn asgi:application --workers 4
+#
+# Every other request, writes included, goes to the WSGI app in a thread
+# when asgiref is installed, otherwise it is answered 404 and the proxy in
+# front is expected to route it to the WSGI workers. The redis page cache
+# backend blocks the loop on each call, the in-process LRU does not.
+#----------------------------------------------------------------------------#
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+
+from app import configure, db, metrics
+from pool import engine_options, register as register_pool
+from timing import finish as finish_timing, start as start_timing
+
+try:
+  from asgiref.wsgi import WsgiToAsgi
+except ImportError:
+  WsgiToAsgi = None
+
+# Views served on the event loop, for GET and HEAD requests
+READ_ENDPOINTS = frozenset(('index', 'venues', 'artists', 'shows', 'show_venue', 'show_artist', 'venue_availability'))
+
+# Async driver of each database when ASYNC_DATABASE_URI is not set
+ASYNC_DRIVERS = {'postgresql': 'asyncpg', 'sqlite': 'aiosqlite'}
+
+def async_database_url(config):
+  if config.get('ASYNC_DATABASE_URI'):
+    return make_url(config['ASYNC_DATABASE_URI'])
+  url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+  return url.set(drivername='%s+%s' % (url.get_backend_name(), ASYNC_DRIVERS[url.get_backend_name()]))
+
+def make_engine(config):
+  url = async_database_url(config)
+  options = engine_options(config, url)
+  if url.get_backend_name() == 'postgresql':
+    # The database refuses writes made through the read path
+    options['execution_options'] = {'postgresql_readonly': True}
+  engine = create_async_engine(url, **options)
+  register_pool(engine.sync_engine, config)
+  return engine
+
+def wsgi_environ(scope):
+  # Builds the WSGI environ of a bodiless ASGI HTTP request
+  server = scope.get('server')
+  base_url = '%s://%s%s' % (scope.get('scheme', 'http'), '%s:%d' % tuple(server) if server else 'localhost', scope.get('root_path', ''))
+  return EnvironBuilder(
+    path=scope['path'],
+    base_url=base_url,
+    query_string=scope.get('query_string', b'').decode('latin-1'),
+    method=scope['method'],
+    headers=[(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']],
+    environ_overrides={'REMOTE_ADDR': scope['client'][0]} if scope.get('client') else None,
+  ).get_environ()
+
+class ReadApplication(object):
+  # ASGI application, one per process. The engine is made on the first read
+  # so importing the module opens no connection.
+  def __init__(self, flask_app, fallback=None):
+    self.app = flask_app
+    self.fallback = fallback
+    self.engine = None
+    self.sessions = None
+
+  async def __call__(self, scope, receive, send):
+    if scope['type'] == 'lifespan':
+      return await self.lifespan(receive, send)
+    if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+      environ = wsgi_environ(scope)
+      if self.endpoint(environ) in READ_ENDPOINTS:
+        return await self.read(environ, send)
+    if self.fallback is not None:
+      await self.fallback(scope, receive, send)
+    elif scope['type'] == 'http':
+      await send({'type': 'http.response.start', 'status': 404, 'headers': [(b'content-type', b'text/plain')]})
+      await send({'type': 'http.response.body', 'body': b'Not served by the read path.'})
+
+  def endpoint(self, environ):
+    try:
+      endpoint, arguments = self.app.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+      return None
+    return endpoint
+
+  async def read(self, environ, send):
+    if self.engine is None:
+      self.engine = make_engine(self.app.config)
+      self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+      if metrics is not None:
+        metrics.watch_pool('async', self.engine.sync_engine)
+    # Timed like the WSGI requests, run_sync's greenlet shares this task's context
+    timing = start_timing(environ['REQUEST_METHOD'], environ['PATH_INFO'])
+    logger = self.app.logger.getChild('timing')
+    try:
+      async with self.sessions() as session:
+        status, headers, body = await session.run_sync(self.dispatch, environ)
+    except Exception:
+      timing.status = 500
+      finish_timing(timing, logger, self.app.config['TIMING_SQL_WARN'])
+      raise
+    timing.status = status
+    timing.bytes = len(body)
+    if self.app.config['SERVER_TIMING']:
+      headers.append(('Server-Timing', timing.server_timing()))
+    await send({
+      'type': 'http.response.start',
+      'status': status,
+      'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    })
+    await send({'type': 'http.response.body', 'body': b'' if environ['REQUEST_METHOD'] == 'HEAD' else body})
+    finish_timing(timing, logger, self.app.config['TIMING_SQL_WARN'])
+
+  def dispatch(self, session, environ):
+    # Runs the Flask view in run_sync's greenlet with db.session bound to the
+    # sync facade of the async session, returning (status, headers, body)
+    with self.app.request_context(environ):
+      db.session.registry.set(session)
+      try:
+        try:
+          response = self.app.full_dispatch_request()
+        except Exception as error:
+          response = self.app.handle_exception(error)
+        return response.status_code, response.headers.to_wsgi_list(), response.get_data()
+      finally:
+        # The async session is closed by read(), not by the app teardown
+        db.session.registry.clear()
+
+  async def lifespan(self, receive, send):
+    while True:
+      message = await receive()
+      if message['type'] == 'lifespan.startup':
+        await send({'type': 'lifespan.startup.complete'})
+      elif message['type'] == 'lifespan.shutdown':
+        if self.engine is not None:
+          await self.engine.dispose()
+        await send({'type': 'lifespan.shutdown.complete'})
+        return
+
+# Set up like the WSGI entry point, with the log queue and its writer thread
+app = configure()
+application = ReadApplication(app, WsgiToAsgi(app) if WsgiToAsgi is not None else None)
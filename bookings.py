@@ -0,0 +1,104 @@
+#----------------------------------------------------------------------------#
+# Venue bookings.
+#
+# A venue can hold one show at a time: shows at the same venue may touch
+# but not overlap. The database enforces it so concurrent bookings cannot
+# both win. Postgres uses an exclusion constraint over
+# tstzrange(starts_at, ends_at) on a GiST index, declared on the Show model.
+# SQLite uses triggers that look for an overlapping show through the
+# (venue_id, starts_at) index. The search is bounded because no show lasts
+# longer than MAX_DURATION, and SQLite serializes writers, so the check
+# cannot race.
+#----------------------------------------------------------------------------#
+
+from bisect import bisect_left
+from datetime import timedelta
+
+from sqlalchemy import event, text
+
+# Longest bookable show, which also bounds the SQLite overlap search
+MAX_DURATION = timedelta(hours=24)
+
+# Name of the Postgres exclusion constraint, also used in the SQLite trigger errors
+OVERLAP_CONSTRAINT = 'show_no_overlap'
+
+def sqlite_trigger_ddl(event_clause, exclude_self=''):
+  # Rejects shows ending before they start or lasting too long, then shows overlapping another at the same venue
+  days = MAX_DURATION.total_seconds() / 86400
+  return (
+    f"CREATE TRIGGER IF NOT EXISTS {OVERLAP_CONSTRAINT}_{event_clause.split()[0].lower()} BEFORE {event_clause} BEGIN "
+    "SELECT RAISE(ABORT, 'ck_show_duration: a show must end after it starts') "
+    f"WHERE julianday(NEW.ends_at) <= julianday(NEW.starts_at) OR julianday(NEW.ends_at) - julianday(NEW.starts_at) > {days}; "
+    f"SELECT RAISE(ABORT, '{OVERLAP_CONSTRAINT}: the venue is already booked at that time') "
+    "WHERE EXISTS (SELECT 1 FROM show WHERE show.venue_id = NEW.venue_id "
+    f"AND show.starts_at > datetime(NEW.starts_at, '-{int(MAX_DURATION.total_seconds())} seconds') "
+    f"AND show.starts_at < NEW.ends_at AND show.ends_at > NEW.starts_at{exclude_self}); "
+    "END"
+  )
+
+def overlap_ddl(dialect_name):
+  if dialect_name == 'postgresql':
+    # The venue_id equality in the GiST exclusion constraint needs btree_gist
+    return ['CREATE EXTENSION IF NOT EXISTS btree_gist']
+  if dialect_name == 'sqlite':
+    return [
+      sqlite_trigger_ddl('INSERT ON show'),
+      sqlite_trigger_ddl('UPDATE OF venue_id, starts_at, ends_at ON show', ' AND show.id != NEW.id'),
+    ]
+  return []
+
+def create_extension(target, connection, **kw):
+  if connection.dialect.name == 'postgresql':
+    for statement in overlap_ddl('postgresql'):
+      connection.execute(text(statement))
+
+def create_triggers(target, connection, **kw):
+  if connection.dialect.name == 'sqlite':
+    for statement in overlap_ddl('sqlite'):
+      connection.execute(text(statement))
+
+def register(table):
+  # Installs the extension before and the triggers after the show table on db.create_all()
+  event.listen(table, 'before_create', create_extension)
+  event.listen(table, 'after_create', create_triggers)
+
+def is_overlap_error(error):
+  # True for the IntegrityError raised by either database when a booking overlaps another
+  return OVERLAP_CONSTRAINT in str(getattr(error, 'orig', error))
+
+def find_conflicts(requests, booked):
+  # Returns the keys of the requested (key, venue_id, starts_at, ends_at)
+  # bookings that overlap a booked (venue_id, starts_at, ends_at) interval or
+  # an earlier request. Booked intervals of a venue never overlap each other,
+  # so only the last one starting before a request ends can collide with it.
+  starts = {}
+  ends = {}
+  for venue_id, starts_at, ends_at in sorted(booked):
+    starts.setdefault(venue_id, []).append(starts_at)
+    ends.setdefault(venue_id, []).append(ends_at)
+  conflicts = set()
+  for key, venue_id, starts_at, ends_at in requests:
+    venue_starts = starts.setdefault(venue_id, [])
+    venue_ends = ends.setdefault(venue_id, [])
+    position = bisect_left(venue_starts, ends_at)
+    if position and venue_ends[position - 1] > starts_at:
+      conflicts.add(key)
+      continue
+    venue_starts.insert(position, starts_at)
+    venue_ends.insert(position, ends_at)
+  return conflicts
+
+def free_windows(booked, start, end):
+  # Yields the (starts_at, ends_at) gaps between the booked intervals within
+  # [start, end). booked must be ordered by start time. One pass merging the
+  # intervals as it goes, so touching or overlapping shows leave no gap.
+  free_from = start
+  for starts_at, ends_at in booked:
+    if starts_at >= end:
+      break
+    if starts_at > free_from:
+      yield free_from, starts_at
+    if ends_at > free_from:
+      free_from = ends_at
+  if free_from < end:
+    yield free_from, end
@@ -0,0 +1,193 @@
+#----------------------------------------------------------------------------#
+# Bulk import and export.
+#
+# Imports stream CSV or JSONL rows, validate each one with the web form of
+# its type and write them in batches. Postgres batches go through COPY,
+# with their ids reserved from the table's sequence beforehand so
+# association rows can be copied too. Other databases use one executemany
+# INSERT per batch. Only the current batch is held in memory, rejected rows
+# go to a JSONL error file with their line number and the form errors.
+#
+# Exports write the same columns back out, one chunk of text per batch of
+# rows, so they can be streamed and imported again.
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+from itertools import islice
+
+from sqlalchemy import text
+from werkzeug.datastructures import MultiDict
+
+# Checkbox values read as unchecked, anything else non-empty is checked
+FALSE_VALUES = ('', '0', 'false', 'f', 'no', 'n', 'off')
+
+def read_rows(stream, file_format):
+  # Yields (line number, row dict) from a CSV file with a header or from JSONL
+  if file_format == 'csv':
+    reader = csv.DictReader(stream)
+    for row in reader:
+      yield reader.line_num, row
+  else:
+    for line_number, line in enumerate(stream, 1):
+      if line.strip():
+        yield line_number, json.loads(line)
+
+def batches(iterable, size):
+  iterator = iter(iterable)
+  while True:
+    batch = list(islice(iterator, size))
+    if not batch:
+      return
+    yield batch
+
+def form_data(row, multiple=(), checkboxes=()):
+  # Turns a row into the form data the HTML form would have posted. Fields in
+  # multiple take a list or a comma separated string, checkboxes are only
+  # posted when checked.
+  data = MultiDict()
+  for key, value in row.items():
+    if value is None:
+      continue
+    if key in multiple:
+      values = value if isinstance(value, list) else str(value).split(',')
+      for item in values:
+        if str(item).strip():
+          data.add(key, str(item).strip())
+    elif key in checkboxes:
+      if str(value).strip().lower() not in FALSE_VALUES:
+        data.add(key, 'y')
+    else:
+      data.add(key, str(value))
+  return data
+
+class RowValidator(object):
+  # Validates rows with the validators of form_class, reusing one bound form
+  # since building a form is most of the cost. Returns (data, errors) where
+  # data is a plain dict of the field values. The field defaults meant to
+  # prefill the HTML forms are not applied, a row only holds what it gives,
+  # so a missing required value is an error. Not thread safe, make one per
+  # request or command.
+  def __init__(self, form_class, choices=None, multiple=(), checkboxes=()):
+    self.form = form_class(formdata=None, meta={'csrf': False})
+    for field, field_choices in (choices or {}).items():
+      self.form[field].choices = field_choices
+    self.blank = {field.short_name: None for field in self.form}
+    self.multiple = multiple
+    self.checkboxes = checkboxes
+
+  def __call__(self, row):
+    form = self.form
+    form.process(formdata=form_data(row, self.multiple, self.checkboxes), data=self.blank)
+    if form.validate():
+      return form.data, {}
+    return form.data, form.errors
+
+class ErrorLog(object):
+  # Appends one JSON line per rejected row
+  def __init__(self, stream):
+    self.stream = stream
+    self.count = 0
+
+  def write(self, line_number, row, errors):
+    self.stream.write(json.dumps({'line': line_number, 'errors': errors, 'row': row}, default=str) + '\n')
+    self.count += 1
+
+#----------------------------------------------------------------------------#
+# Batch writes.
+#----------------------------------------------------------------------------#
+
+def reserve_ids(connection, table, count):
+  # Draws count ids from the Postgres sequence behind table.id
+  return [id for id, in connection.execute(
+    text(f"SELECT nextval(pg_get_serial_sequence('{table.name}', 'id')) FROM generate_series(1, :count)"),
+    {'count': count}
+  )]
+
+def copy_value(value):
+  # Encodes a value in the COPY text format
+  if value is None:
+    return '\\N'
+  if hasattr(value, 'isoformat'):
+    value = value.isoformat()
+  return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+def copy_rows(connection, table, columns, rows):
+  buffer = io.StringIO()
+  for row in rows:
+    buffer.write('\t'.join(copy_value(row[column]) for column in columns) + '\n')
+  statement = f"COPY {connection.dialect.identifier_preparer.format_table(table)} ({', '.join(columns)}) FROM STDIN"
+  cursor = connection.connection.cursor()
+  try:
+    if hasattr(cursor, 'copy_expert'):
+      # psycopg2
+      buffer.seek(0)
+      cursor.copy_expert(statement, buffer)
+    else:
+      # psycopg 3
+      with cursor.copy(statement) as copy:
+        copy.write(buffer.getvalue())
+  finally:
+    cursor.close()
+
+def insert_rows(connection, table, rows, return_ids=False):
+  # Inserts rows in one batch and returns their ids in order when asked to.
+  # Rows may leave out columns with server defaults, so they are written in
+  # groups sharing the same columns.
+  ids = [None] * len(rows)
+  groups = {}
+  for position, row in enumerate(rows):
+    groups.setdefault(tuple(row), []).append(position)
+  postgres = connection.dialect.name == 'postgresql'
+  for columns, positions in groups.items():
+    group = [rows[position] for position in positions]
+    if postgres:
+      if return_ids:
+        group = [dict(row, id=id) for row, id in zip(group, reserve_ids(connection, table, len(group)))]
+        columns = columns + ('id',)
+      copy_rows(connection, table, columns, group)
+      group_ids = [row.get('id') for row in group]
+    elif return_ids:
+      result = connection.execute(table.insert().returning(table.c.id, sort_by_parameter_order=True), group)
+      group_ids = [id for id, in result]
+    else:
+      connection.execute(table.insert(), group)
+      group_ids = [None] * len(group)
+    for position, id in zip(positions, group_ids):
+      ids[position] = id
+  return ids if return_ids else None
+
+#----------------------------------------------------------------------------#
+# Export.
+#----------------------------------------------------------------------------#
+
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+def csv_value(value):
+  # Writes lists the way read_rows expects them back and booleans as true/false
+  if isinstance(value, list):
+    return ','.join(value)
+  if isinstance(value, bool):
+    return 'true' if value else 'false'
+  return value
+
+def export_chunks(records, columns, file_format, chunk_rows=1000):
+  # Yields the records as CSV with a header or as JSONL, one string per chunk_rows records
+  header = file_format == 'csv'
+  for batch in batches(records, chunk_rows):
+    buffer = io.StringIO()
+    if file_format == 'csv':
+      writer = csv.writer(buffer)
+      if header:
+        writer.writerow(columns)
+        header = False
+      writer.writerows([csv_value(record[column]) for column in columns] for record in batch)
+    else:
+      for record in batch:
+        buffer.write(json.dumps({column: record[column] for column in columns}, default=str) + '\n')
+    yield buffer.getvalue()
+  if header:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(columns)
+    yield buffer.getvalue()
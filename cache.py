@@ -0,0 +1,111 @@
+#----------------------------------------------------------------------------#
+# Page cache.
+#
+# Read-through cache for the data assembled by the venue and artist detail
+# views. The default backend is an in-process LRU with a TTL, so writes made
+# through one worker only invalidate that worker's copy and other workers
+# serve their entry until it expires. Point CACHE_BACKEND at 'redis' to
+# share one cache, and its invalidations, between every worker.
+#----------------------------------------------------------------------------#
+
+import pickle
+import time
+from collections import OrderedDict
+from threading import Lock
+
+class CacheBackend(object):
+  # Interface implemented by every backend
+  def get(self, key):
+    # Returns the stored value or None when missing or expired
+    raise NotImplementedError
+
+  def set(self, key, value, ttl):
+    raise NotImplementedError
+
+  def delete(self, *keys):
+    raise NotImplementedError
+
+class LRUCacheBackend(CacheBackend):
+  def __init__(self, max_entries=1024):
+    self.max_entries = max_entries
+    self._entries = OrderedDict()
+    self._lock = Lock()
+
+  def get(self, key):
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return None
+      expires_at, value = entry
+      if expires_at < time.monotonic():
+        del self._entries[key]
+        return None
+      self._entries.move_to_end(key)
+      return value
+
+  def set(self, key, value, ttl):
+    with self._lock:
+      self._entries[key] = (time.monotonic() + ttl, value)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def delete(self, *keys):
+    with self._lock:
+      for key in keys:
+        self._entries.pop(key, None)
+
+class RedisCacheBackend(CacheBackend):
+  # Works with any client exposing the redis-py get/set/delete calls
+  def __init__(self, client, prefix='fyyur:'):
+    self.client = client
+    self.prefix = prefix
+
+  def get(self, key):
+    value = self.client.get(self.prefix + key)
+    return pickle.loads(value) if value is not None else None
+
+  def set(self, key, value, ttl):
+    self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl)
+
+  def delete(self, *keys):
+    if keys:
+      self.client.delete(*[self.prefix + key for key in keys])
+
+class PageCache(object):
+  def __init__(self, backend, ttl=300):
+    self.backend = backend
+    self.ttl = ttl
+    self.hits = 0
+    self.misses = 0
+    self._lock = Lock()
+
+  def get_or_set(self, key, producer):
+    # Returns the cached value for key, or stores what producer returns unless it is None
+    value = self.backend.get(key)
+    with self._lock:
+      if value is None:
+        self.misses += 1
+      else:
+        self.hits += 1
+    if value is None:
+      value = producer()
+      if value is not None:
+        self.backend.set(key, value, self.ttl)
+    return value
+
+  def invalidate(self, *keys):
+    self.backend.delete(*keys)
+
+  def stats(self):
+    with self._lock:
+      return {'hits': self.hits, 'misses': self.misses}
+
+def make_cache(config):
+  # Builds the page cache described by CACHE_BACKEND and its settings
+  if config.get('CACHE_BACKEND') == 'redis':
+    import redis
+    backend = RedisCacheBackend(redis.Redis.from_url(config['CACHE_REDIS_URL']))
+  else:
+    backend = LRUCacheBackend(config.get('CACHE_MAX_ENTRIES', 1024))
+  return PageCache(backend, config.get('CACHE_TTL', 300))
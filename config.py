@@ -1,14 +1,138 @@
 import os
-SECRET_KEY = os.urandom(32)
+
+def env_flag(name, default):
+  return os.environ.get(name, 'true' if default else 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+
+# Deployment profile, 'development' or 'production'. Production takes its
+# secrets from the environment so every worker process shares them.
+PROFILE = os.environ.get('FLASK_ENV', 'development')
+PRODUCTION = PROFILE == 'production'
+
+# Signs the session cookie, flashed messages and the CSRF tokens of the forms,
+# so it must be the same in every worker. A random key only suits a single
+# development process.
+SECRET_KEY = os.environ.get('SECRET_KEY')
+if not SECRET_KEY:
+  if PRODUCTION:
+    raise RuntimeError('SECRET_KEY must be set in production')
+  SECRET_KEY = os.urandom(32)
+
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 # Enable debug mode.
-DEBUG = True
+DEBUG = env_flag('DEBUG', not PRODUCTION)
 
-# Connect to the database
+# Connect to the database, DATABASE_URL as set by Heroku and most hosts
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgresql:///artist_booking')
+if SQLALCHEMY_DATABASE_URI.startswith('postgres://'):
+  SQLALCHEMY_DATABASE_URI = 'postgresql://' + SQLALCHEMY_DATABASE_URI[len('postgres://'):]
+SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+# Session cookie only sent over HTTPS in production
+SESSION_COOKIE_SECURE = env_flag('SESSION_COOKIE_SECURE', PRODUCTION)
+SESSION_COOKIE_SAMESITE = 'Lax'
 
-# TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql:///artist_booking'
-SQLALCHEMY_TRACK_MODIFICATIONS = False
+# Number of reverse proxies in front of the app whose X-Forwarded-* headers
+# are trusted, so the client address and scheme are the real ones
+PROXY_COUNT = int(os.environ.get('PROXY_COUNT', 0))
+
+# File receiving the application log outside debug mode
+ERROR_LOG = os.environ.get('ERROR_LOG', 'error.log')
+
+# Share of the requests logged with their headers, and how many bytes of
+# their body are logged with them, 0 to leave bodies out
+REQUEST_LOG_SAMPLE_RATE = float(os.environ.get('REQUEST_LOG_SAMPLE_RATE', 0.01 if PRODUCTION else 1))
+REQUEST_LOG_BODY_BYTES = int(os.environ.get('REQUEST_LOG_BODY_BYTES', 0))
+
+# Log records waiting for the writer thread, further ones are dropped
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+# Send the request timings in a Server-Timing header, they are logged either
+# way, and log requests running more SQL statements than this as warnings
+SERVER_TIMING = env_flag('SERVER_TIMING', True)
+TIMING_SQL_WARN = int(os.environ.get('TIMING_SQL_WARN', 25))
+
+# Request latency buckets of /metrics in seconds, and how often each worker
+# copies its pool and page cache figures into the metrics
+METRICS_BUCKETS = tuple(float(bound) for bound in os.environ.get(
+  'METRICS_BUCKETS', '0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10').split(','))
+METRICS_SAMPLE_SECONDS = float(os.environ.get('METRICS_SAMPLE_SECONDS', 1))
+
+# Connection pool of each worker: connections kept open, extra ones opened
+# under load, seconds to wait for a free one, seconds before a connection
+# is replaced, and whether to test connections before handing them out
+DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', 5))
+DATABASE_MAX_OVERFLOW = int(os.environ.get('DATABASE_MAX_OVERFLOW', 10))
+DATABASE_POOL_TIMEOUT = float(os.environ.get('DATABASE_POOL_TIMEOUT', 10))
+DATABASE_POOL_RECYCLE = int(os.environ.get('DATABASE_POOL_RECYCLE', 1800))
+DATABASE_POOL_PRE_PING = env_flag('DATABASE_POOL_PRE_PING', True)
+
+# Postgres statement timeout in milliseconds, 0 for none
+DATABASE_STATEMENT_TIMEOUT = int(os.environ.get('DATABASE_STATEMENT_TIMEOUT', 0))
+
+# Connect through PgBouncer in transaction pooling mode
+DATABASE_PGBOUNCER = env_flag('DATABASE_PGBOUNCER', False)
+
+# Read replicas for GET and HEAD requests, comma separated database URLs.
+# A browser session reads from the primary for the given number of seconds
+# after each write so it sees its own changes despite replication lag
+DATABASE_REPLICA_URIS = [uri.strip() for uri in os.environ.get('DATABASE_REPLICA_URIS', '').split(',') if uri.strip()]
+DATABASE_REPLICA_STICKY_SECONDS = float(os.environ.get('DATABASE_REPLICA_STICKY_SECONDS', 10))
+
+# Client networks allowed to read the /internal endpoints
+INTERNAL_NETWORKS = os.environ.get('INTERNAL_NETWORKS', '127.0.0.0/8,::1/128').split(',')
+
+# Number of city/state areas listed per page on /venues
+AREAS_PER_PAGE = 50
+AREAS_PER_PAGE_MAX = 500
+
+# Number of upcoming shows listed per page on /shows
+SHOWS_PER_PAGE = 30
+SHOWS_PER_PAGE_MAX = 200
+
+# Number of results per page on the venue and artist searches
+SEARCH_RESULTS_PER_PAGE = 20
+SEARCH_RESULTS_PER_PAGE_MAX = 100
+
+# Number of names returned per type by /search/suggest
+SUGGESTIONS_LIMIT = 10
+SUGGESTIONS_LIMIT_MAX = 50
+
+# Seconds between checks of whether the names behind /search/suggest changed
+# through another worker or an import, each check is one indexed query
+SUGGESTIONS_REFRESH_SECONDS = 5
+
+# Page cache for the venue and artist detail views: 'lru' keeps it in each
+# process, 'redis' shares it between processes through CACHE_REDIS_URL
+CACHE_BACKEND = 'lru'
+CACHE_TTL = 300
+CACHE_MAX_ENTRIES = 1024
+CACHE_REDIS_URL = 'redis://localhost:6379/0'
+
+# Refresh the Postgres area summary after every committed venue or show write
+# instead of only from `flask refresh-areas`, SQLite triggers keep it current
+AREA_SUMMARY_REFRESH_ON_WRITE = False
+
+# Rows fetched per round trip by the streaming exports, also the number of
+# rows per chunk of the response
+EXPORT_YIELD_PER = 1000
+
+# Number of records per page of the JSON API listings
+API_PAGE_SIZE = 50
+API_PAGE_SIZE_MAX = 500
+
+# Largest array accepted by the batch show endpoint
+API_BATCH_MAX = 5000
+
+# Length in minutes of shows booked without an end time
+SHOW_DEFAULT_DURATION = 180
+
+# Date range in days of /venues/<id>/availability when ?to= is left out,
+# and the longest range it accepts
+AVAILABILITY_DAYS = 30
+AVAILABILITY_DAYS_MAX = 366
+
+# Database URL of the ASGI read path in asgi.py, by default
+# SQLALCHEMY_DATABASE_URI with the asyncpg or aiosqlite driver
+ASYNC_DATABASE_URI = None
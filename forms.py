@@ -1,7 +1,8 @@
 from datetime import datetime
 from flask_wtf import FlaskForm
 from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms.validators import DataRequired, AnyOf, URL, Optional, ValidationError
+from bookings import MAX_DURATION
 
 class ShowForm(FlaskForm):
     artist_id = StringField(
@@ -17,6 +18,19 @@ class ShowForm(FlaskForm):
         validators=[DataRequired()],
         default=datetime.today()
     )
+    # Left blank, the show lasts the configured default duration
+    end_time = DateTimeField(
+        'end_time',
+        validators=[Optional()]
+    )
+
+    def validate_end_time(form, field):
+        if field.data is None or form.start_time.data is None:
+            return
+        if field.data <= form.start_time.data:
+            raise ValidationError('The end time must be after the start time.')
+        if field.data - form.start_time.data > MAX_DURATION:
+            raise ValidationError('A show can last at most %d hours.' % (MAX_DURATION.total_seconds() // 3600))
 
 class VenueForm(FlaskForm):
     name = StringField(
@@ -90,29 +104,10 @@ class VenueForm(FlaskForm):
     image_link = StringField(
         'image_link', validators=[URL()]
     )
+    # Choices are loaded from the genre table by the view
     genres = SelectMultipleField(
         'genres', validators=[DataRequired()],
-        choices=[
-            ('Alternative', 'Alternative'),
-            ('Blues', 'Blues'),
-            ('Classical', 'Classical'),
-            ('Country', 'Country'),
-            ('Electronic', 'Electronic'),
-            ('Folk', 'Folk'),
-            ('Funk', 'Funk'),
-            ('Hip-Hop', 'Hip-Hop'),
-            ('Heavy Metal', 'Heavy Metal'),
-            ('Instrumental', 'Instrumental'),
-            ('Jazz', 'Jazz'),
-            ('Musical Theatre', 'Musical Theatre'),
-            ('Pop', 'Pop'),
-            ('Punk', 'Punk'),
-            ('R&B', 'R&B'),
-            ('Reggae', 'Reggae'),
-            ('Rock n Roll', 'Rock n Roll'),
-            ('Soul', 'Soul'),
-            ('Other', 'Other'),
-        ]
+        choices=[]
     )
     facebook_link = StringField(
         'facebook_link', validators=[URL()]
@@ -196,29 +191,10 @@ class ArtistForm(FlaskForm):
     image_link = StringField(
         'image_link'
     )
+    # Choices are loaded from the genre table by the view
     genres = SelectMultipleField(
         'genres', validators=[DataRequired()],
-        choices=[
-            ('Alternative', 'Alternative'),
-            ('Blues', 'Blues'),
-            ('Classical', 'Classical'),
-            ('Country', 'Country'),
-            ('Electronic', 'Electronic'),
-            ('Folk', 'Folk'),
-            ('Funk', 'Funk'),
-            ('Hip-Hop', 'Hip-Hop'),
-            ('Heavy Metal', 'Heavy Metal'),
-            ('Instrumental', 'Instrumental'),
-            ('Jazz', 'Jazz'),
-            ('Musical Theatre', 'Musical Theatre'),
-            ('Pop', 'Pop'),
-            ('Punk', 'Punk'),
-            ('R&B', 'R&B'),
-            ('Reggae', 'Reggae'),
-            ('Rock n Roll', 'Rock n Roll'),
-            ('Soul', 'Soul'),
-            ('Other', 'Other'),
-        ]
+        choices=[]
     )
     facebook_link = StringField(
         'facebook_link', validators=[URL()]
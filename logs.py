@@ -0,0 +1,114 @@
+#----------------------------------------------------------------------------#
+# Logging.
+#
+# The app logger hands its records to a bounded in-memory queue and one
+# background thread per process writes them out, so a slow disk or a full
+# pipe never holds up a request. When the writer falls behind and the
+# queue is full, records are dropped and counted instead of blocking.
+#
+# Request logs are sampled, REQUEST_LOG_SAMPLE_RATE of the requests are
+# logged with their headers, and the body is only captured when
+# REQUEST_LOG_BODY_BYTES is set: the first that many bytes, recorded as the
+# view reads its input, so the body is never buffered a second time.
+#----------------------------------------------------------------------------#
+
+import atexit
+import json
+import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+
+# Headers left out of the request logs
+SECRET_HEADERS = frozenset(('Authorization', 'Cookie', 'Proxy-Authorization'))
+
+class DroppingQueueHandler(QueueHandler):
+  # Never blocks the logging thread, records that do not fit are counted
+  def __init__(self, queue):
+    super(DroppingQueueHandler, self).__init__(queue)
+    self.dropped = 0
+
+  def enqueue(self, record):
+    try:
+      self.queue.put_nowait(record)
+    except queue.Full:
+      self.dropped += 1
+
+class DrainingQueueListener(QueueListener):
+  # Waits for room for the stop sentinel, the writer thread frees it as it
+  # drains the queue, where the stock listener fails with queue.Full
+  def enqueue_sentinel(self):
+    self.queue.put(self._sentinel)
+
+class LogQueue(object):
+  # A queue handler for the loggers and the thread writing its records to
+  # handlers. A forked worker gets its own queue and thread, threads do not
+  # survive a fork.
+  def __init__(self, handlers, size):
+    self.handlers = handlers
+    self.size = size
+    self.handler = DroppingQueueHandler(queue.Queue(size))
+    self.listener = None
+    os.register_at_fork(after_in_child=self.restart)
+    atexit.register(self.stop)
+
+  def start(self):
+    self.listener = DrainingQueueListener(self.handler.queue, *self.handlers, respect_handler_level=True)
+    self.listener.start()
+
+  def stop(self):
+    # Writes out what is queued, then stops the thread
+    if self.listener is not None:
+      self.listener.stop()
+      self.listener = None
+
+  def restart(self):
+    self.handler.queue = queue.Queue(self.size)
+    self.handler.dropped = 0
+    if self.listener is not None:
+      self.start()
+
+class CappedInput(object):
+  # Passes a WSGI input stream through, keeping the first limit bytes read
+  def __init__(self, stream, limit):
+    self.stream = stream
+    self.limit = limit
+    self.captured = b''
+
+  def _keep(self, data):
+    if len(self.captured) < self.limit:
+      self.captured += data[:self.limit - len(self.captured)]
+    return data
+
+  def read(self, *args):
+    return self._keep(self.stream.read(*args))
+
+  def readline(self, *args):
+    return self._keep(self.stream.readline(*args))
+
+  def readlines(self, *args):
+    return [self._keep(line) for line in self.stream.readlines(*args)]
+
+  def __iter__(self):
+    for line in self.stream:
+      yield self._keep(line)
+
+def sample_request(environ, rate, body_bytes):
+  # Decides whether to log this request, capturing its body from here on when asked to
+  if rate <= 0 or random.random() >= rate:
+    return False
+  if body_bytes:
+    environ['wsgi.input'] = CappedInput(environ['wsgi.input'], body_bytes)
+  return True
+
+def request_log_line(request, response):
+  line = {
+    'method': request.method,
+    'path': request.full_path if request.query_string else request.path,
+    'status': response.status_code,
+    'headers': {name: value for name, value in request.headers.items() if name not in SECRET_HEADERS},
+  }
+  captured = request.environ.get('wsgi.input')
+  if isinstance(captured, CappedInput):
+    line['body'] = captured.captured.decode('utf-8', 'replace')
+  return json.dumps(line, separators=(',', ':'))
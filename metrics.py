@@ -0,0 +1,164 @@
+#----------------------------------------------------------------------------#
+# Metrics.
+#
+# /metrics in the Prometheus text format, through prometheus_client when it
+# is installed: requests and their latency per endpoint, the connection
+# pools, the page cache, the creates, edits and deletes that failed and the
+# log records dropped by a full log queue.
+#
+# Recording keeps off shared locks where it can. A request adds one count
+# and one latency observation, on label children looked up once per
+# endpoint. The pools, the page cache and the log queue already count for
+# themselves, so their figures are copied into the metrics by one thread at
+# a time, at most every METRICS_SAMPLE_SECONDS as requests finish and
+# before each scrape, instead of on every checkout, lookup and log record.
+#
+# With several worker processes, set PROMETHEUS_MULTIPROC_DIR to an empty
+# directory, emptied again at every start, before the app is imported.
+# Each worker then keeps its figures in memory-mapped files there and a
+# scrape answered by any worker adds them all up. The pool gauges only
+# count live workers, so the gunicorn config reports the workers that exit:
+#
+#   # gunicorn.conf.py
+#   from metrics import child_exit
+#----------------------------------------------------------------------------#
+
+import atexit
+import os
+import time
+from threading import Lock
+
+from pool import pool_stats
+
+try:
+  from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+except ImportError:
+  CollectorRegistry = None
+
+# Pool occupancy reported per state
+POOL_STATES = ('checked_out', 'idle', 'overflow')
+
+def multiprocess_dir():
+  return os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+class Metrics(object):
+  def __init__(self, buckets, sample_seconds):
+    self.registry = CollectorRegistry()
+    self.requests = Counter('fyyur_requests', 'Requests served, by endpoint and status.',
+                            ('endpoint', 'status'), registry=self.registry)
+    self.latency = Histogram('fyyur_request_duration_seconds', 'Request wall time, by endpoint.',
+                             ('endpoint',), buckets=buckets, registry=self.registry)
+    self.failures = Counter('fyyur_write_failures', 'Creates, edits and deletes rolled back on an error.',
+                            ('action', 'model'), registry=self.registry)
+    self.pool_connections = Gauge('fyyur_db_pool_connections', 'Pooled database connections, by state.',
+                                  ('database', 'state'), registry=self.registry, multiprocess_mode='livesum')
+    self.pool_checkouts = Counter('fyyur_db_pool_checkouts', 'Connections handed out by the pools.',
+                                  ('database',), registry=self.registry)
+    self.pool_timeouts = Counter('fyyur_db_pool_checkout_timeouts', 'Checkouts that gave up waiting for a connection.',
+                                 ('database',), registry=self.registry)
+    self.pool_wait = Counter('fyyur_db_pool_checkout_wait_seconds', 'Time spent waiting for a connection.',
+                             ('database',), registry=self.registry)
+    self.cache_lookups = Counter('fyyur_cache_lookups', 'Cache lookups, by result.',
+                                 ('cache', 'result'), registry=self.registry)
+    self.cache_hit_ratio = Gauge('fyyur_cache_hit_ratio', 'Share of the cache lookups of each worker that hit.',
+                                 ('cache',), registry=self.registry, multiprocess_mode='liveall')
+    self.log_dropped = Counter('fyyur_log_records_dropped', 'Log records dropped because the log queue was full.',
+                               registry=self.registry)
+    self.sample_seconds = sample_seconds
+    self.pools = {}
+    self.caches = {}
+    self.log_queue = None
+    self._children = {}
+    self._seen = {}
+    self._next_sample = 0.0
+    self._sampling = Lock()
+    # Counters outlive their worker in multiprocess mode, so they get its last figures
+    atexit.register(self.sample, True)
+
+  def watch_pool(self, name, engine):
+    # Reports the pool of engine, whichever pool it holds after a dispose
+    self.pools[name] = engine
+
+  def watch_cache(self, name, cache):
+    self.caches[name] = cache
+
+  def watch_log_queue(self, log_queue):
+    # Reports the records dropped by a logs.LogQueue
+    self.log_queue = log_queue
+
+  def observe_request(self, timing):
+    # Counts a finished request, a timing.RequestTiming
+    key = (timing.endpoint or 'unmatched', str(timing.status))
+    children = self._children.get(key)
+    if children is None:
+      children = self._children[key] = (self.requests.labels(*key), self.latency.labels(key[0]))
+    children[0].inc()
+    children[1].observe(timing.elapsed())
+    self.sample()
+
+  def count_failure(self, action, model):
+    self.failures.labels(action, model).inc()
+
+  def sample(self, wait=False):
+    # Copies the pool, cache and log queue figures, unless another thread is at it or they are recent
+    now = time.monotonic()
+    if not wait and now < self._next_sample:
+      return
+    if not self._sampling.acquire(blocking=wait):
+      return
+    try:
+      self._next_sample = now + self.sample_seconds
+      for name, engine in self.pools.items():
+        self._sample_pool(name, pool_stats(engine.pool))
+      for name, cache in self.caches.items():
+        self._sample_cache(name, cache.stats())
+      if self.log_queue is not None:
+        self._advance(self.log_dropped, ('log_dropped',), self.log_queue.handler.dropped)
+    finally:
+      self._sampling.release()
+
+  def _advance(self, counter, key, total):
+    # Adds what a running total grew by since the last sample, all of it
+    # when the total restarted with a new pool
+    delta = total - self._seen.get(key, 0)
+    if delta < 0:
+      delta = total
+    if delta > 0:
+      counter.inc(delta)
+    self._seen[key] = total
+
+  def _sample_pool(self, name, stats):
+    for state in POOL_STATES:
+      if state in stats:
+        self.pool_connections.labels(name, state).set(stats[state])
+    if 'checkouts' in stats:
+      self._advance(self.pool_checkouts.labels(name), ('checkouts', name), stats['checkouts'])
+      self._advance(self.pool_timeouts.labels(name), ('timeouts', name), stats['timeouts'])
+      self._advance(self.pool_wait.labels(name), ('wait', name), stats['wait_seconds_total'])
+
+  def _sample_cache(self, name, stats):
+    self._advance(self.cache_lookups.labels(name, 'hit'), ('hits', name), stats['hits'])
+    self._advance(self.cache_lookups.labels(name, 'miss'), ('misses', name), stats['misses'])
+    lookups = stats['hits'] + stats['misses']
+    if lookups:
+      self.cache_hit_ratio.labels(name).set(stats['hits'] / lookups)
+
+  def exposition(self):
+    # Body and content type of a scrape, adding up every worker's files in multiprocess mode
+    self.sample(wait=True)
+    registry = self.registry
+    if multiprocess_dir():
+      registry = CollectorRegistry()
+      multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def make_metrics(config):
+  # The metrics of an app, None without prometheus_client
+  if CollectorRegistry is None:
+    return None
+  return Metrics(config['METRICS_BUCKETS'], config['METRICS_SAMPLE_SECONDS'])
+
+def child_exit(server, worker):
+  # gunicorn server hook, leaves the gauges of an exited worker out of the scrapes
+  if CollectorRegistry is not None and multiprocess_dir():
+    multiprocess.mark_process_dead(worker.pid)
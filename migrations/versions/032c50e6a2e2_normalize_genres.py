@@ -0,0 +1,111 @@
+"""normalize genres into genre and association tables
+
+Revision ID: 032c50e6a2e2
+Revises: ae170bf338f0
+Create Date: 2026-10-18 11:52:16.904871
+
+Replaces the comma-joined venue.genres and artist.genres strings with a
+genre table and indexed venue_genre / artist_genre association tables.
+Existing strings are converted in id-ranged batches before the string
+columns are dropped.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '032c50e6a2e2'
+down_revision = 'ae170bf338f0'
+branch_labels = None
+depends_on = None
+
+# Rows converted per batch
+BATCH_SIZE = 5000
+
+# Genres offered by the forms before they were loaded from the table
+DEFAULT_GENRES = (
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+    'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz',
+    'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll',
+    'Soul', 'Other',
+)
+
+genre = sa.table('genre', sa.column('id', sa.Integer), sa.column('name', sa.String))
+
+
+def association(table):
+    return sa.table(f'{table}_genre', sa.column(f'{table}_id', sa.Integer), sa.column('genre_id', sa.Integer))
+
+
+def upgrade():
+    op.create_table('genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    for table in ('venue', 'artist'):
+        op.create_table(f'{table}_genre',
+        sa.Column(f'{table}_id', sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['genre_id'], ['genre.id'], ),
+        sa.ForeignKeyConstraint([f'{table}_id'], [f'{table}.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint(f'{table}_id', 'genre_id')
+        )
+        op.create_index(f'ix_{table}_genre_genre_id_{table}_id', f'{table}_genre', ['genre_id', f'{table}_id'], unique=False)
+
+    bind = op.get_bind()
+    op.bulk_insert(genre, [{'name': name} for name in DEFAULT_GENRES])
+    genre_ids = dict(bind.execute(sa.select(genre.c.name, genre.c.id)).fetchall())
+
+    for table in ('venue', 'artist'):
+        low, high = bind.execute(sa.text(f'SELECT MIN(id), MAX(id) FROM {table}')).fetchone()
+        if low is None:
+            continue
+        for start in range(low, high + 1, BATCH_SIZE):
+            rows = bind.execute(sa.text(
+                f'SELECT id, genres FROM {table} WHERE id >= :start AND id < :end'
+            ), {'start': start, 'end': start + BATCH_SIZE}).fetchall()
+            links = set()
+            for row in rows:
+                for name in (row.genres or '').split(','):
+                    name = name.strip()
+                    if not name:
+                        continue
+                    if name not in genre_ids:
+                        bind.execute(genre.insert().values(name=name))
+                        genre_ids[name] = bind.execute(
+                            sa.select(genre.c.id).where(genre.c.name == name)
+                        ).scalar()
+                    links.add((row.id, genre_ids[name]))
+            if links:
+                op.bulk_insert(association(table), [{f'{table}_id': id, 'genre_id': genre_id} for id, genre_id in links])
+        op.drop_column(table, 'genres')
+
+
+def downgrade():
+    bind = op.get_bind()
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column('genres', sa.String(length=120), nullable=True))
+        link = association(table)
+        rows = bind.execute(
+            sa.select(link.c[f'{table}_id'], genre.c.name)
+            .select_from(link.join(genre, link.c.genre_id == genre.c.id))
+            .order_by(link.c[f'{table}_id'], genre.c.name)
+        )
+        names = {}
+        for id, name in rows:
+            names.setdefault(id, []).append(name)
+        target = sa.table(table, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+        if names:
+            bind.execute(
+                target.update().where(target.c.id == sa.bindparam('row_id')).values(genres=sa.bindparam('value')),
+                [{'row_id': id, 'value': ','.join(values)} for id, values in names.items()]
+            )
+        op.execute(f"UPDATE {table} SET genres = '' WHERE genres IS NULL")
+        if bind.dialect.name != 'sqlite':
+            op.alter_column(table, 'genres', existing_type=sa.String(length=120), nullable=False)
+        op.drop_index(f'ix_{table}_genre_genre_id_{table}_id', table_name=f'{table}_genre')
+        op.drop_table(f'{table}_genre')
+    op.drop_table('genre')
@@ -0,0 +1,33 @@
+"""drop the genres strings left by the genre normalization
+
+Revision ID: 1d3fb1cbd4ab
+Revises: 7828de877c70
+Create Date: 2026-10-19 09:12:44.518320
+
+Revision 032c50e6a2e2 skipped dropping venue.genres and artist.genres
+when the table was empty, leaving a NOT NULL column that inserts from
+the app no longer fill. It is dropped here wherever it is still present.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1d3fb1cbd4ab'
+down_revision = '7828de877c70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    for table in ('venue', 'artist'):
+        columns = {column['name'] for column in sa.inspect(bind).get_columns(table)}
+        if 'genres' in columns:
+            op.drop_column(table, 'genres')
+
+
+def downgrade():
+    # 032c50e6a2e2 adds the columns back with their values on its own downgrade
+    pass
@@ -0,0 +1,70 @@
+"""show counters on venue and artist
+
+Revision ID: 2668eb99945d
+Revises: 579e5f2f045e
+Create Date: 2026-10-18 13:20:44.862013
+
+Adds the denormalized upcoming_shows_count, past_shows_count and
+next_show_at columns, the show (owner, starts_at) indexes that keep
+recounts cheap, and fills the counters in id-ranged batches. Afterwards
+`flask recount-shows` keeps rolling started shows over to the past
+counters.
+
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2668eb99945d'
+down_revision = '579e5f2f045e'
+branch_labels = None
+depends_on = None
+
+# Rows recounted per backfill transaction
+BATCH_SIZE = 5000
+
+OWNERS = (('venue', 'venue_id'), ('artist', 'artist_id'))
+
+RECOUNT = """
+    UPDATE {table} SET
+      upcoming_shows_count = (SELECT COUNT(*) FROM show WHERE show.{owner_id} = {table}.id AND show.starts_at >= :now),
+      past_shows_count = (SELECT COUNT(*) FROM show WHERE show.{owner_id} = {table}.id AND show.starts_at < :now),
+      next_show_at = (SELECT MIN(show.starts_at) FROM show WHERE show.{owner_id} = {table}.id AND show.starts_at >= :now)
+    WHERE id >= :start AND id < :end
+"""
+
+
+def upgrade():
+    for table, _ in OWNERS:
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('next_show_at', sa.DateTime(timezone=True), nullable=True))
+
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        for table, owner_id in OWNERS:
+            op.create_index(f'ix_show_{owner_id}_starts_at', 'show', [owner_id, 'starts_at'], unique=False, postgresql_concurrently=True)
+            op.create_index(f'ix_{table}_next_show_at', table, ['next_show_at'], unique=False, postgresql_concurrently=True)
+
+        now = datetime.now(timezone.utc)
+        for table, owner_id in OWNERS:
+            statement = sa.text(RECOUNT.format(table=table, owner_id=owner_id)).bindparams(
+                sa.bindparam('now', type_=sa.DateTime(timezone=True))
+            )
+            low, high = bind.execute(sa.text(f'SELECT MIN(id), MAX(id) FROM {table}')).fetchone()
+            if low is None:
+                continue
+            for start in range(low, high + 1, BATCH_SIZE):
+                bind.execute(statement, {'now': now, 'start': start, 'end': start + BATCH_SIZE})
+
+
+def downgrade():
+    for table, owner_id in OWNERS:
+        op.drop_index(f'ix_{table}_next_show_at', table_name=table)
+        op.drop_index(f'ix_show_{owner_id}_starts_at', table_name='show')
+        op.drop_column(table, 'next_show_at')
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
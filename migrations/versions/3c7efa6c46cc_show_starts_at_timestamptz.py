@@ -0,0 +1,97 @@
+"""show starts_at timestamptz with online backfill
+
+Revision ID: 3c7efa6c46cc
+Revises: c75d80c80679
+Create Date: 2026-10-18 10:26:51.774932
+
+Expand step of the show.start_time string to timestamptz switch. Adds a
+nullable starts_at column, keeps it in sync with the legacy string column
+on Postgres with a trigger while older app instances are still writing
+only start_time, and backfills existing rows in bounded batches, each in
+its own transaction, so the show table is never locked as a whole.
+
+The legacy start_time column is left in place and dual-written by the app
+until every instance runs the new code; dropping it is a separate contract
+migration.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import dateutil.parser
+import dateutil.tz
+
+
+# revision identifiers, used by Alembic.
+revision = '3c7efa6c46cc'
+down_revision = 'c75d80c80679'
+branch_labels = None
+depends_on = None
+
+# Rows updated per backfill transaction
+BATCH_SIZE = 5000
+
+
+def _parse_utc(value):
+    date = dateutil.parser.parse(value)
+    if date.tzinfo is None:
+        return date.replace(tzinfo=dateutil.tz.tzutc())
+    return date.astimezone(dateutil.tz.tzutc())
+
+
+def upgrade():
+    bind = op.get_bind()
+    postgres = bind.dialect.name == 'postgresql'
+
+    op.add_column('show', sa.Column('starts_at', sa.DateTime(timezone=True), nullable=True))
+
+    if postgres:
+        # Fills starts_at for rows written by instances that only know start_time
+        op.execute("""
+            CREATE OR REPLACE FUNCTION show_sync_starts_at() RETURNS trigger AS $$
+            BEGIN
+              IF NEW.starts_at IS NULL
+                 OR (TG_OP = 'UPDATE'
+                     AND NEW.start_time IS DISTINCT FROM OLD.start_time
+                     AND NEW.starts_at IS NOT DISTINCT FROM OLD.starts_at) THEN
+                NEW.starts_at := CAST(NEW.start_time AS timestamptz);
+              END IF;
+              RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        op.execute("""
+            CREATE TRIGGER show_sync_starts_at
+            BEFORE INSERT OR UPDATE ON show
+            FOR EACH ROW EXECUTE PROCEDURE show_sync_starts_at()
+        """)
+
+    with op.get_context().autocommit_block():
+        low, high = bind.execute(sa.text('SELECT MIN(id), MAX(id) FROM show')).fetchone()
+        if low is not None:
+            for start in range(low, high + 1, BATCH_SIZE):
+                if postgres:
+                    bind.execute(sa.text(
+                        'UPDATE show SET starts_at = CAST(start_time AS timestamptz) '
+                        'WHERE id >= :start AND id < :end AND starts_at IS NULL'
+                    ), {'start': start, 'end': start + BATCH_SIZE})
+                else:
+                    rows = bind.execute(sa.text(
+                        'SELECT id, start_time FROM show '
+                        'WHERE id >= :start AND id < :end AND starts_at IS NULL'
+                    ), {'start': start, 'end': start + BATCH_SIZE}).fetchall()
+                    if rows:
+                        show = sa.table('show', sa.column('id', sa.Integer), sa.column('starts_at', sa.DateTime(timezone=True)))
+                        bind.execute(
+                            show.update().where(show.c.id == sa.bindparam('row_id')).values(starts_at=sa.bindparam('value')),
+                            [{'row_id': row.id, 'value': _parse_utc(row.start_time)} for row in rows]
+                        )
+        op.create_index('ix_show_starts_at_id', 'show', ['starts_at', 'id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    bind = op.get_bind()
+    op.drop_index('ix_show_starts_at_id', table_name='show')
+    if bind.dialect.name == 'postgresql':
+        op.execute('DROP TRIGGER IF EXISTS show_sync_starts_at ON show')
+        op.execute('DROP FUNCTION IF EXISTS show_sync_starts_at()')
+    op.drop_column('show', 'starts_at')
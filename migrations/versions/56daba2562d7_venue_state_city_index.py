@@ -0,0 +1,24 @@
+"""venue state/city index
+
+Revision ID: 56daba2562d7
+Revises: f8e5067bad3a
+Create Date: 2026-10-18 09:12:04.318520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '56daba2562d7'
+down_revision = 'f8e5067bad3a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_venue_state_city', 'venue', ['state', 'city'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_venue_state_city', table_name='venue')
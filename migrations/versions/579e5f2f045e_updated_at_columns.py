@@ -0,0 +1,43 @@
+"""updated_at columns on venue, artist and show
+
+Revision ID: 579e5f2f045e
+Revises: 032c50e6a2e2
+Create Date: 2026-10-18 12:37:09.451806
+
+On Postgres the column is added with a now() default, which fills the
+existing rows without rewriting the table. SQLite cannot add a column
+with a non-constant default, so existing rows are stamped afterwards.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '579e5f2f045e'
+down_revision = '032c50e6a2e2'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venue', 'artist', 'show')
+
+
+def upgrade():
+    bind = op.get_bind()
+    postgres = bind.dialect.name == 'postgresql'
+    for table in TABLES:
+        if postgres:
+            op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+            op.alter_column(table, 'updated_at', server_default=None)
+        else:
+            op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+            op.execute(f"UPDATE {table} SET updated_at = CURRENT_TIMESTAMP")
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.create_index(f'ix_{table}_updated_at', table, ['updated_at'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+        op.drop_column(table, 'updated_at')
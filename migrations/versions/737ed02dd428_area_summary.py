@@ -0,0 +1,86 @@
+"""area summary for the venues directory
+
+Revision ID: 737ed02dd428
+Revises: 2668eb99945d
+Create Date: 2026-10-18 14:02:31.518204
+
+One row per (state, city) with the venue count, upcoming show count and
+top genres. Postgres gets a materialized view with the unique index that
+REFRESH ... CONCURRENTLY needs, SQLite a table recomputed per area by
+triggers on venue and venue_genre.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '737ed02dd428'
+down_revision = '2668eb99945d'
+branch_labels = None
+depends_on = None
+
+TOP_GENRES = 3
+
+POSTGRES_GENRES = "string_agg(top.name, ',' ORDER BY top.venues DESC, top.name)"
+SQLITE_GENRES = "group_concat(top.name, ',')"
+
+TRIGGERS = ('venue_ai', 'venue_ad', 'venue_au', 'genre_ai', 'genre_ad')
+
+
+def summary_select(genres, where=''):
+    return (
+        "SELECT venue.state AS state, venue.city AS city, COUNT(*) AS venue_count, "
+        "SUM(venue.upcoming_shows_count) AS upcoming_shows_count, "
+        f"(SELECT {genres} FROM (SELECT genre.name AS name, COUNT(*) AS venues FROM venue_genre "
+        "JOIN genre ON genre.id = venue_genre.genre_id "
+        "JOIN venue AS area_venue ON area_venue.id = venue_genre.venue_id "
+        "WHERE area_venue.state = venue.state AND area_venue.city = venue.city "
+        f"GROUP BY genre.name ORDER BY venues DESC, genre.name LIMIT {TOP_GENRES}) AS top) AS top_genres "
+        f"FROM venue {where} GROUP BY venue.state, venue.city"
+    )
+
+
+def refresh_area(state, city):
+    return (
+        f"DELETE FROM area_summary WHERE state = {state} AND city = {city}; "
+        "INSERT INTO area_summary (state, city, venue_count, upcoming_shows_count, top_genres) "
+        f"{summary_select(SQLITE_GENRES, f'WHERE venue.state = {state} AND venue.city = {city}')}; "
+    )
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute(f"CREATE MATERIALIZED VIEW area_summary AS {summary_select(POSTGRES_GENRES)}")
+        op.execute('CREATE UNIQUE INDEX ix_area_summary_state_city ON area_summary (state, city)')
+    elif bind.dialect.name == 'sqlite':
+        op.create_table('area_summary',
+        sa.Column('state', sa.String(length=120), nullable=False),
+        sa.Column('city', sa.String(length=120), nullable=False),
+        sa.Column('venue_count', sa.Integer(), nullable=False),
+        sa.Column('upcoming_shows_count', sa.Integer(), nullable=False),
+        sa.Column('top_genres', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('state', 'city')
+        )
+        genre_state = lambda row: f"(SELECT state FROM venue WHERE id = {row}.venue_id)"
+        genre_city = lambda row: f"(SELECT city FROM venue WHERE id = {row}.venue_id)"
+        op.execute(f"CREATE TRIGGER area_summary_venue_ai AFTER INSERT ON venue BEGIN {refresh_area('new.state', 'new.city')}END")
+        op.execute(f"CREATE TRIGGER area_summary_venue_ad AFTER DELETE ON venue BEGIN {refresh_area('old.state', 'old.city')}END")
+        op.execute(
+            "CREATE TRIGGER area_summary_venue_au AFTER UPDATE OF state, city, upcoming_shows_count ON venue BEGIN "
+            f"{refresh_area('old.state', 'old.city')}{refresh_area('new.state', 'new.city')}END"
+        )
+        op.execute(f"CREATE TRIGGER area_summary_genre_ai AFTER INSERT ON venue_genre BEGIN {refresh_area(genre_state('new'), genre_city('new'))}END")
+        op.execute(f"CREATE TRIGGER area_summary_genre_ad AFTER DELETE ON venue_genre BEGIN {refresh_area(genre_state('old'), genre_city('old'))}END")
+        op.execute(f"INSERT INTO area_summary (state, city, venue_count, upcoming_shows_count, top_genres) {summary_select(SQLITE_GENRES)}")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute('DROP MATERIALIZED VIEW IF EXISTS area_summary')
+    elif bind.dialect.name == 'sqlite':
+        for suffix in TRIGGERS:
+            op.execute(f'DROP TRIGGER IF EXISTS area_summary_{suffix}')
+        op.drop_table('area_summary')
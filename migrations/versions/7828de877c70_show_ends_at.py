@@ -0,0 +1,144 @@
+"""show ends_at and no overlapping bookings per venue
+
+Revision ID: 7828de877c70
+Revises: 737ed02dd428
+Create Date: 2026-10-18 16:30:21.342103
+
+Adds show.ends_at, backfilled in bounded batches with the default show
+duration, and stops a venue from holding two overlapping shows. Postgres
+gets a CHECK on the duration and an exclusion constraint over
+tstzrange(starts_at, ends_at) on a GiST index (btree_gist provides the
+venue_id equality), and the starts_at sync trigger now also fills ends_at
+for rows written by older app instances. SQLite gets triggers rejecting
+invalid durations and overlapping shows.
+
+Existing overlapping shows make the upgrade fail with their ids listed,
+they have to be rescheduled first.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import timedelta
+
+
+# revision identifiers, used by Alembic.
+revision = '7828de877c70'
+down_revision = '737ed02dd428'
+branch_labels = None
+depends_on = None
+
+# Rows updated per backfill transaction
+BATCH_SIZE = 5000
+
+# Duration given to existing shows, matches SHOW_DEFAULT_DURATION
+DEFAULT_DURATION = timedelta(minutes=180)
+
+# Longest bookable show, matches bookings.MAX_DURATION
+MAX_DURATION = timedelta(hours=24)
+
+SYNC_FUNCTION = """
+    CREATE OR REPLACE FUNCTION show_sync_starts_at() RETURNS trigger AS $$
+    BEGIN
+      IF NEW.starts_at IS NULL
+         OR (TG_OP = 'UPDATE'
+             AND NEW.start_time IS DISTINCT FROM OLD.start_time
+             AND NEW.starts_at IS NOT DISTINCT FROM OLD.starts_at) THEN
+        NEW.starts_at := CAST(NEW.start_time AS timestamptz);
+      END IF;{ends_at}
+      RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+SYNC_ENDS_AT = f"""
+      IF NEW.ends_at IS NULL THEN
+        NEW.ends_at := NEW.starts_at + interval '{int(DEFAULT_DURATION.total_seconds())} seconds';
+      END IF;"""
+
+
+def sqlite_trigger(event_clause, exclude_self=''):
+    return (
+        f"CREATE TRIGGER show_no_overlap_{event_clause.split()[0].lower()} BEFORE {event_clause} BEGIN "
+        "SELECT RAISE(ABORT, 'ck_show_duration: a show must end after it starts') "
+        "WHERE julianday(NEW.ends_at) <= julianday(NEW.starts_at) "
+        f"OR julianday(NEW.ends_at) - julianday(NEW.starts_at) > {MAX_DURATION.total_seconds() / 86400}; "
+        "SELECT RAISE(ABORT, 'show_no_overlap: the venue is already booked at that time') "
+        "WHERE EXISTS (SELECT 1 FROM show WHERE show.venue_id = NEW.venue_id "
+        f"AND show.starts_at > datetime(NEW.starts_at, '-{int(MAX_DURATION.total_seconds())} seconds') "
+        f"AND show.starts_at < NEW.ends_at AND show.ends_at > NEW.starts_at{exclude_self}); "
+        "END"
+    )
+
+
+def check_overlaps(bind):
+    overlaps = bind.execute(sa.text(
+        'SELECT a.id, b.id FROM show AS a JOIN show AS b '
+        'ON a.venue_id = b.venue_id AND a.id < b.id '
+        'AND a.starts_at < b.ends_at AND b.starts_at < a.ends_at '
+        'LIMIT 20'
+    )).fetchall()
+    if overlaps:
+        raise RuntimeError(
+            'Overlapping shows must be rescheduled before upgrading: '
+            + ', '.join('%d and %d' % (first, second) for first, second in overlaps)
+        )
+
+
+def upgrade():
+    bind = op.get_bind()
+    postgres = bind.dialect.name == 'postgresql'
+
+    op.add_column('show', sa.Column('ends_at', sa.DateTime(timezone=True), nullable=True))
+
+    if postgres:
+        # Fills ends_at for rows written by instances that do not know it
+        op.execute(SYNC_FUNCTION.format(ends_at=SYNC_ENDS_AT))
+
+    with op.get_context().autocommit_block():
+        low, high = bind.execute(sa.text('SELECT MIN(id), MAX(id) FROM show')).fetchone()
+        if low is not None:
+            for start in range(low, high + 1, BATCH_SIZE):
+                if postgres:
+                    bind.execute(sa.text(
+                        'UPDATE show SET ends_at = starts_at + :duration '
+                        'WHERE id >= :start AND id < :end AND ends_at IS NULL'
+                    ), {'duration': DEFAULT_DURATION, 'start': start, 'end': start + BATCH_SIZE})
+                else:
+                    show = sa.table('show',
+                        sa.column('id', sa.Integer),
+                        sa.column('starts_at', sa.DateTime(timezone=True)),
+                        sa.column('ends_at', sa.DateTime(timezone=True)))
+                    rows = bind.execute(
+                        sa.select(show.c.id, show.c.starts_at)
+                        .where(show.c.id >= start, show.c.id < start + BATCH_SIZE, show.c.ends_at.is_(None))
+                    ).fetchall()
+                    if rows:
+                        bind.execute(
+                            show.update().where(show.c.id == sa.bindparam('row_id')).values(ends_at=sa.bindparam('value')),
+                            [{'row_id': row.id, 'value': row.starts_at + DEFAULT_DURATION} for row in rows]
+                        )
+
+    check_overlaps(bind)
+    if postgres:
+        op.alter_column('show', 'ends_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+        op.create_check_constraint('ck_show_duration', 'show', 'ends_at > starts_at')
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        op.execute(
+            'ALTER TABLE show ADD CONSTRAINT show_no_overlap '
+            'EXCLUDE USING gist (venue_id WITH =, tstzrange(starts_at, ends_at) WITH &&)'
+        )
+    elif bind.dialect.name == 'sqlite':
+        op.execute(sqlite_trigger('INSERT ON show'))
+        op.execute(sqlite_trigger('UPDATE OF venue_id, starts_at, ends_at ON show', ' AND show.id != NEW.id'))
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.drop_constraint('show_no_overlap', 'show')
+        op.drop_constraint('ck_show_duration', 'show', type_='check')
+        op.execute(SYNC_FUNCTION.format(ends_at=''))
+    elif bind.dialect.name == 'sqlite':
+        op.execute('DROP TRIGGER IF EXISTS show_no_overlap_insert')
+        op.execute('DROP TRIGGER IF EXISTS show_no_overlap_update')
+    op.drop_column('show', 'ends_at')
@@ -0,0 +1,73 @@
+"""name and city search indexes
+
+Revision ID: ae170bf338f0
+Revises: 3c7efa6c46cc
+Create Date: 2026-10-18 11:08:43.190257
+
+Trigram GIN indexes on venue and artist name and city on Postgres, which
+serve ILIKE '%term%' without a sequential scan. SQLite gets external
+content FTS5 trigram tables kept in sync by triggers instead.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ae170bf338f0'
+down_revision = '3c7efa6c46cc'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venue', 'artist')
+COLUMNS = ('name', 'city')
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        with op.get_context().autocommit_block():
+            for table in TABLES:
+                for column in COLUMNS:
+                    op.create_index(
+                        f'ix_{table}_{column}_trgm', table, [column], unique=False,
+                        postgresql_using='gin',
+                        postgresql_ops={column: 'gin_trgm_ops'},
+                        postgresql_concurrently=True
+                    )
+    elif bind.dialect.name == 'sqlite':
+        columns = ', '.join(COLUMNS)
+        new_values = ', '.join(f'new.{column}' for column in COLUMNS)
+        old_values = ', '.join(f'old.{column}' for column in COLUMNS)
+        for table in TABLES:
+            op.execute(
+                f"CREATE VIRTUAL TABLE {table}_search USING fts5({columns}, content='{table}', content_rowid='id', tokenize='trigram')"
+            )
+            op.execute(
+                f"CREATE TRIGGER {table}_search_ai AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {table}_search(rowid, {columns}) VALUES (new.id, {new_values}); END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {table}_search_ad AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {table}_search({table}_search, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {table}_search_au AFTER UPDATE ON {table} BEGIN "
+                f"INSERT INTO {table}_search({table}_search, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+                f"INSERT INTO {table}_search(rowid, {columns}) VALUES (new.id, {new_values}); END"
+            )
+            op.execute(f"INSERT INTO {table}_search({table}_search) VALUES ('rebuild')")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        for table in TABLES:
+            for column in COLUMNS:
+                op.drop_index(f'ix_{table}_{column}_trgm', table_name=table)
+    elif bind.dialect.name == 'sqlite':
+        for table in TABLES:
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute(f'DROP TRIGGER IF EXISTS {table}_search_{suffix}')
+            op.execute(f'DROP TABLE IF EXISTS {table}_search')
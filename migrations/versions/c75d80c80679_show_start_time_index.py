@@ -0,0 +1,24 @@
+"""show start_time index
+
+Revision ID: c75d80c80679
+Revises: 56daba2562d7
+Create Date: 2026-10-18 09:41:27.605113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c75d80c80679'
+down_revision = '56daba2562d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_show_start_time_id', 'show', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_start_time_id', table_name='show')
@@ -0,0 +1,138 @@
+#----------------------------------------------------------------------------#
+# Connection pool.
+#
+# Builds the engine options from the DATABASE_* settings, read from the
+# environment in config.py: pool size and overflow, checkout timeout,
+# recycle age, pre-ping and a per-statement timeout. The pools record how
+# long each checkout waited for a connection, reported with the pool
+# occupancy by /internal/pool.
+#
+# DATABASE_PGBOUNCER makes the connections safe behind PgBouncer in
+# transaction pooling mode, where consecutive transactions of one client
+# connection may run on different server connections. The drivers stop
+# preparing named server-side statements, and the statement timeout is set
+# with SET LOCAL at the start of every transaction, one extra round trip
+# each, instead of as a session setting when connecting.
+#----------------------------------------------------------------------------#
+
+import os
+import time
+from threading import Lock
+from uuid import uuid4
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+class WaitStats(object):
+  # Checkout count, timeouts and total and longest wait of one pool
+  def __init__(self):
+    self.checkouts = 0
+    self.timeouts = 0
+    self.wait_total = 0.0
+    self.wait_max = 0.0
+    self._lock = Lock()
+
+  def record(self, seconds, timed_out):
+    with self._lock:
+      self.checkouts += 1
+      self.timeouts += timed_out
+      self.wait_total += seconds
+      if seconds > self.wait_max:
+        self.wait_max = seconds
+
+class TimedPoolMixin(object):
+  # Times every checkout, including opening a new connection when the pool
+  # may still grow into its overflow
+  def __init__(self, *args, **kwargs):
+    super(TimedPoolMixin, self).__init__(*args, **kwargs)
+    self.wait_stats = WaitStats()
+
+  def _do_get(self):
+    started = time.perf_counter()
+    timed_out = False
+    try:
+      return super(TimedPoolMixin, self)._do_get()
+    except PoolTimeoutError:
+      timed_out = True
+      raise
+    finally:
+      self.wait_stats.record(time.perf_counter() - started, timed_out)
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+  pass
+
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+  pass
+
+def engine_options(config, url):
+  # Engine options for the database at url, a sqlalchemy URL
+  backend = url.get_backend_name()
+  if backend == 'sqlite' and url.database in (None, '', ':memory:'):
+    # A memory database lives in its one connection, Flask-SQLAlchemy pools it statically
+    return {}
+  options = {
+    'poolclass': TimedAsyncQueuePool if url.get_dialect().is_async else TimedQueuePool,
+    'pool_size': config['DATABASE_POOL_SIZE'],
+    'max_overflow': config['DATABASE_MAX_OVERFLOW'],
+    'pool_timeout': config['DATABASE_POOL_TIMEOUT'],
+    'pool_recycle': config['DATABASE_POOL_RECYCLE'],
+    'pool_pre_ping': config['DATABASE_POOL_PRE_PING'],
+  }
+  if backend != 'postgresql':
+    return options
+  driver = url.get_driver_name()
+  timeout = config['DATABASE_STATEMENT_TIMEOUT']
+  connect_args = {}
+  if config['DATABASE_PGBOUNCER']:
+    if driver == 'psycopg':
+      connect_args['prepare_threshold'] = None
+    elif driver == 'asyncpg':
+      connect_args['statement_cache_size'] = 0
+      connect_args['prepared_statement_cache_size'] = 0
+      # Unique names so a statement never collides with one left on another server connection
+      connect_args['prepared_statement_name_func'] = lambda: '__asyncpg_%s__' % uuid4()
+  elif timeout:
+    if driver == 'asyncpg':
+      connect_args['server_settings'] = {'statement_timeout': str(timeout)}
+    else:
+      connect_args['options'] = '-c statement_timeout=%d' % timeout
+  if connect_args:
+    options['connect_args'] = connect_args
+  return options
+
+def set_local_statement_timeout(timeout):
+  def begin(connection):
+    connection.exec_driver_sql('SET LOCAL statement_timeout = %d' % timeout)
+  return begin
+
+def register(engine, config):
+  # Sets the statement timeout per transaction where it cannot be a session setting
+  if engine.dialect.name == 'postgresql' and config['DATABASE_PGBOUNCER'] and config['DATABASE_STATEMENT_TIMEOUT']:
+    event.listen(engine, 'begin', set_local_statement_timeout(config['DATABASE_STATEMENT_TIMEOUT']))
+  # A forked worker starts with an empty pool instead of sharing the parent's
+  # connections, leaving them open for the parent
+  os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+
+def pool_stats(pool, max_overflow=None):
+  # Occupancy and checkout waits of a pool, only its class for pools that do not
+  # queue. max_overflow is the configured limit, the pool does not expose it.
+  stats = {'pool': type(pool).__name__}
+  if isinstance(pool, QueuePool):
+    stats.update({
+      'size': pool.size(),
+      'checked_out': pool.checkedout(),
+      'idle': pool.checkedin(),
+      'overflow': max(pool.overflow(), 0),
+    })
+    if max_overflow is not None:
+      stats['max_overflow'] = max_overflow
+  wait_stats = getattr(pool, 'wait_stats', None)
+  if wait_stats is not None:
+    stats.update({
+      'checkouts': wait_stats.checkouts,
+      'timeouts': wait_stats.timeouts,
+      'wait_seconds_total': round(wait_stats.wait_total, 6),
+      'wait_seconds_max': round(wait_stats.wait_max, 6),
+    })
+  return stats
@@ -0,0 +1,45 @@
+#----------------------------------------------------------------------------#
+# Read replicas.
+#
+# Each URL in DATABASE_REPLICA_URIS becomes a replica_<n> bind. The queries
+# of GET and HEAD requests go to one replica picked per request, while
+# flushes, DML statements and every other request use the primary. A
+# browser session that committed a write reads from the primary for
+# DATABASE_REPLICA_STICKY_SECONDS afterwards, so the page after a form
+# submission shows the change even while the replicas lag behind.
+#----------------------------------------------------------------------------#
+
+import random
+from contextlib import contextmanager
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy.engine import make_url
+
+def replica_binds(config, options):
+  # SQLALCHEMY_BINDS entries of the replicas, options(url) giving the engine options of each
+  return {
+    'replica_%d' % number: dict(options(make_url(uri)), url=uri)
+    for number, uri in enumerate(config['DATABASE_REPLICA_URIS'])
+  }
+
+class RoutingSession(Session):
+  # Reads from the bind named by info['replica'] when set
+  def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+    replica = self.info.get('replica')
+    if replica is not None and bind is None and not self._flushing and not getattr(clause, 'is_dml', False):
+      return self._db.engines[replica]
+    return super(RoutingSession, self).get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def use_replica(session, binds):
+  # Sends the reads of session to one of the replica binds, picked at random
+  session.info['replica'] = random.choice(binds)
+
+@contextmanager
+def primary(session):
+  # Reads from the primary within the block
+  replica = session.info.pop('replica', None)
+  try:
+    yield
+  finally:
+    if replica is not None:
+      session.info['replica'] = replica
@@ -0,0 +1,89 @@
+#----------------------------------------------------------------------------#
+# Search engines.
+#
+# Case-insensitive substring search over the names of venues and artists.
+# Postgres answers it from pg_trgm GIN indexes and ranks by trigram
+# similarity, SQLite from FTS5 trigram tables kept in sync by triggers,
+# and any other database falls back to a plain ILIKE scan. The city is
+# indexed as well but not matched.
+#----------------------------------------------------------------------------#
+
+from sqlalchemy import event, func, text
+
+# Columns of the search indexes
+SEARCH_COLUMNS = ('name', 'city')
+
+# Column matched and ranked by every search
+MATCH_COLUMN = 'name'
+
+# Tables that get an FTS5 index when the schema is created on SQLite
+SEARCH_TABLES = ('venue', 'artist')
+
+def escape_like(term):
+  return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+class LikeSearchEngine(object):
+  # Matches with ILIKE and ranks shorter, closer names first
+  def match(self, model, term):
+    pattern = f"%{escape_like(term)}%"
+    return getattr(model, MATCH_COLUMN).ilike(pattern, escape='\\')
+
+  def rank(self, model, term):
+    name = getattr(model, MATCH_COLUMN)
+    return [func.length(name), name, model.id]
+
+class TrigramSearchEngine(LikeSearchEngine):
+  # ILIKE is served by the gin_trgm_ops indexes, ranking uses pg_trgm similarity
+  def rank(self, model, term):
+    name = getattr(model, MATCH_COLUMN)
+    return [func.similarity(name, term).desc(), name, model.id]
+
+class FTSSearchEngine(LikeSearchEngine):
+  # Trigram phrase queries need at least three characters, shorter terms use ILIKE
+  def match(self, model, term):
+    if len(term) < 3:
+      return super(FTSSearchEngine, self).match(model, term)
+    table = model.__tablename__
+    phrase = '%s : "%s"' % (MATCH_COLUMN, term.replace('"', '""'))
+    return text(
+      f"{table}.id IN (SELECT rowid FROM {table}_search WHERE {table}_search MATCH :search_phrase)"
+    ).bindparams(search_phrase=phrase)
+
+_engines = {
+  'postgresql': TrigramSearchEngine(),
+  'sqlite': FTSSearchEngine(),
+}
+
+def get_search_engine(dialect_name):
+  return _engines.get(dialect_name, LikeSearchEngine())
+
+#----------------------------------------------------------------------------#
+# SQLite FTS5 schema.
+#----------------------------------------------------------------------------#
+
+def fts_ddl(table):
+  columns = ', '.join(SEARCH_COLUMNS)
+  new_values = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS)
+  old_values = ', '.join(f'old.{column}' for column in SEARCH_COLUMNS)
+  return [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_search USING fts5({columns}, content='{table}', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN "
+    f"INSERT INTO {table}_search(rowid, {columns}) VALUES (new.id, {new_values}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN "
+    f"INSERT INTO {table}_search({table}_search, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {table}_search_au AFTER UPDATE ON {table} BEGIN "
+    f"INSERT INTO {table}_search({table}_search, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+    f"INSERT INTO {table}_search(rowid, {columns}) VALUES (new.id, {new_values}); END",
+    f"INSERT INTO {table}_search({table}_search) VALUES ('rebuild')",
+  ]
+
+def create_fts_tables(target, connection, **kw):
+  if connection.dialect.name != 'sqlite':
+    return
+  for table in SEARCH_TABLES:
+    for statement in fts_ddl(table):
+      connection.execute(text(statement))
+
+def register(metadata):
+  # Creates the FTS5 tables alongside the models on db.create_all()
+  event.listen(metadata, 'after_create', create_fts_tables)
@@ -0,0 +1,87 @@
+#----------------------------------------------------------------------------#
+# Prefix index.
+#
+# Sorted array of lowercased names searched with bisect, used for search as
+# you type. It is loaded from the database on first use and kept current by
+# the create, edit and delete handlers of this process. Writers rebuild the
+# array under a lock and swap it in, so lookups never lock and never see a
+# half-applied change. Each worker process holds its own copy, so the index
+# also remembers a version of the data it was built from, checked at most
+# every check_seconds, and is rebuilt once writes made through another
+# worker or by the import command change that version.
+#----------------------------------------------------------------------------#
+
+import time
+from bisect import bisect_left, insort
+from threading import Lock
+
+class PrefixIndex(object):
+  def __init__(self, check_seconds=0):
+    self._entries = []
+    self._names = {}
+    self._lock = Lock()
+    self.loaded = False
+    self.version = None
+    self.check_seconds = check_seconds
+    self._checked_at = 0.0
+
+  def load(self, loader, version=None):
+    # Builds the index from the (id, name) rows returned by loader. Once
+    # loaded it is only rebuilt when version, a callable returning the
+    # current version of the rows, returns something new.
+    if self.loaded and (version is None or time.monotonic() < self._checked_at + self.check_seconds):
+      return
+    with self._lock:
+      now = time.monotonic()
+      if self.loaded and (version is None or now < self._checked_at + self.check_seconds):
+        return
+      # Read before the rows, so a write in between only causes another rebuild
+      current = version() if version is not None else None
+      self._checked_at = now
+      if self.loaded and current == self.version:
+        return
+      names = {id: name for id, name in loader()}
+      self._entries = sorted((name.lower(), id, name) for id, name in names.items())
+      self._names = names
+      self.version = current
+      self.loaded = True
+
+  def invalidate(self):
+    # Rebuilds the index on the next load, searches keep the current entries until then
+    with self._lock:
+      self.loaded = False
+
+  def add(self, id, name):
+    # Inserts or renames an entry, ignored until the index has been loaded
+    with self._lock:
+      if not self.loaded:
+        return
+      entries = list(self._entries)
+      if id in self._names:
+        del entries[bisect_left(entries, (self._names[id].lower(), id, self._names[id]))]
+      insort(entries, (name.lower(), id, name))
+      self._names[id] = name
+      self._entries = entries
+
+  def remove(self, id):
+    with self._lock:
+      if not self.loaded or id not in self._names:
+        return
+      entries = list(self._entries)
+      del entries[bisect_left(entries, (self._names[id].lower(), id, self._names[id]))]
+      del self._names[id]
+      self._entries = entries
+
+  def search(self, prefix, limit=10):
+    # Returns up to limit {'id', 'name'} matches in name order
+    entries = self._entries
+    prefix = prefix.lower()
+    results = []
+    position = bisect_left(entries, (prefix,))
+    while position < len(entries) and len(results) < limit:
+      key, id, name = entries[position]
+      if not key.startswith(prefix):
+        break
+      results.append({'id': id, 'name': name})
+      position += 1
+    return results
@@ -0,0 +1,34 @@
+import os
+import tempfile
+
+# The app reads its settings when imported, so the test database is chosen first
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DATABASE_PATH
+os.environ['REQUEST_LOG_SAMPLE_RATE'] = '0'
+
+import pytest
+
+import app as app_module
+from cache import LRUCacheBackend
+from suggest import PrefixIndex
+
+@pytest.fixture
+def app():
+  # The app on an empty database, with empty caches and suggestion indexes
+  flask_app = app_module.app
+  flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+  with flask_app.app_context():
+    app_module.db.engine.dispose()
+    if os.path.exists(DATABASE_PATH):
+      os.remove(DATABASE_PATH)
+    app_module.db.create_all()
+  app_module.page_cache.backend = LRUCacheBackend(flask_app.config['CACHE_MAX_ENTRIES'])
+  app_module.venue_suggestions = PrefixIndex()
+  app_module.artist_suggestions = PrefixIndex()
+  with flask_app.app_context():
+    yield flask_app
+    app_module.db.session.remove()
+
+@pytest.fixture
+def client(app):
+  return app.test_client()
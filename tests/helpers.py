@@ -0,0 +1,40 @@
+from contextlib import contextmanager
+from datetime import timedelta
+
+from sqlalchemy import event
+
+import app as app_module
+
+@contextmanager
+def count_queries():
+  # Counts the statements sent to the primary database within the block
+  counter = {'count': 0}
+  def count(*args):
+    counter['count'] += 1
+  engine = app_module.db.engine
+  event.listen(engine, 'before_cursor_execute', count)
+  try:
+    yield counter
+  finally:
+    event.remove(engine, 'before_cursor_execute', count)
+
+def add_venue(name='The Venue', city='San Francisco', state='CA', **values):
+  venue = app_module.Venue(name=name, city=city, state=state, address='1 Main St', phone='123-123-1234', **values)
+  app_module.db.session.add(venue)
+  app_module.db.session.commit()
+  return venue
+
+def add_artist(name='The Artist', city='San Francisco', state='CA', **values):
+  artist = app_module.Artist(name=name, city=city, state=state, phone='123-123-1234', **values)
+  app_module.db.session.add(artist)
+  app_module.db.session.commit()
+  return artist
+
+def add_show(venue, artist, starts_at):
+  show = app_module.Show(venue_id=venue.id, artist_id=artist.id, starts_at=starts_at)
+  app_module.db.session.add(show)
+  app_module.db.session.commit()
+  return show
+
+def days_from_now(days):
+  return app_module.utcnow() + timedelta(days=days)
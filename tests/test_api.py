@@ -0,0 +1,28 @@
+import pytest
+
+from api import encode_cursor
+from tests.helpers import add_artist, add_show, add_venue, days_from_now
+
+def upcoming_shows(count):
+  venue = add_venue()
+  artist = add_artist()
+  return [add_show(venue, artist, days_from_now(day + 1)) for day in range(count)]
+
+def test_show_cursor_without_offset_is_utc(client):
+  first, second = upcoming_shows(2)
+  cursor = encode_cursor(first.starts_at.replace(tzinfo=None).isoformat(), first.id)
+  response = client.get('/api/v1/shows?fields=id&cursor=' + cursor)
+  assert response.status_code == 200
+  assert response.get_json()['data'] == [{'id': second.id}]
+
+def test_show_pages_follow_the_cursor(client):
+  shows = upcoming_shows(3)
+  first = client.get('/api/v1/shows?fields=id&limit=2').get_json()
+  second = client.get('/api/v1/shows?fields=id&limit=2&cursor=' + first['next_cursor']).get_json()
+  assert [row['id'] for row in first['data'] + second['data']] == [show.id for show in shows]
+  assert second['next_cursor'] is None
+
+@pytest.mark.parametrize('start', ['tomorrow', 5, None])
+def test_show_cursor_with_a_bad_start_is_rejected(client, start):
+  response = client.get('/api/v1/shows?cursor=' + encode_cursor(start, 1))
+  assert response.status_code == 400
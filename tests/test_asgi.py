@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('aiosqlite')
+pytest.importorskip('greenlet')
+
+import app as app_module
+import asgi
+from cache import LRUCacheBackend
+from tests.helpers import add_artist, add_show, add_venue, days_from_now
+
+@pytest.fixture
+def application(app):
+  # The module's application, with its async engine dropped after each test
+  # since every test starts on a new database file
+  yield asgi.application
+  if asgi.application.engine is not None:
+    asyncio.run(asgi.application.engine.dispose())
+    asgi.application.engine = None
+    asgi.application.sessions = None
+
+def asgi_get(application, path):
+  scope = {
+    'type': 'http',
+    'method': 'GET',
+    'scheme': 'http',
+    'path': path,
+    'root_path': '',
+    'query_string': b'',
+    'headers': [(b'host', b'localhost')],
+    'server': ('localhost', 80),
+    'client': ('127.0.0.1', 50000),
+  }
+  messages = []
+  async def receive():
+    return {'type': 'http.request', 'body': b'', 'more_body': False}
+  async def send(message):
+    messages.append(message)
+  asyncio.run(application(scope, receive, send))
+  start, body = messages
+  return start['status'], dict(start['headers']), body['body']
+
+def test_read_views_match_the_wsgi_app(application, client):
+  venue = add_venue(name='The Blue Note')
+  artist = add_artist(name='Guns N Petals')
+  add_show(venue, artist, days_from_now(1))
+  for path in ('/venues', '/artists', '/shows', '/venues/%d' % venue.id, '/artists/%d' % artist.id):
+    status, headers, body = asgi_get(application, path)
+    # The detail pages would otherwise be answered from what the read path cached
+    app_module.page_cache.backend = LRUCacheBackend(app_module.app.config['CACHE_MAX_ENTRIES'])
+    response = client.get(path)
+    assert status == response.status_code == 200, path
+    assert body == response.get_data(), path
+    assert headers[b'etag'].decode('latin-1') == response.headers['ETag'], path
+
+def test_other_requests_are_not_served_on_the_loop(application):
+  status, headers, body = asgi_get(application, '/export/venues')
+  assert status == (404 if asgi.WsgiToAsgi is None else 200)
+  assert application.engine is None
+
+def test_application_is_configured(application):
+  assert application.app is app_module.app
+  assert app_module.log_queue.handler in app_module.app.logger.handlers
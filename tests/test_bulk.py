@@ -0,0 +1,55 @@
+import app as app_module
+from bulk import RowValidator
+from forms import ShowForm, VenueForm
+from tests.helpers import add_artist, add_venue, days_from_now
+
+def test_show_rows_need_a_start_time(app):
+  data, errors = RowValidator(ShowForm)({'venue_id': '1', 'artist_id': '1'})
+  assert 'start_time' in errors
+  assert data['start_time'] is None
+
+def test_show_rows_keep_their_start_time(app):
+  data, errors = RowValidator(ShowForm)({'venue_id': '1', 'artist_id': '1', 'start_time': '2030-05-01 20:00:00'})
+  assert errors == {}
+  assert data['start_time'].isoformat() == '2030-05-01T20:00:00'
+
+def test_one_row_does_not_leak_into_the_next(app):
+  validate = RowValidator(VenueForm, choices={'genres': [('Jazz', 'Jazz')]}, multiple=('genres',), checkboxes=('seeking_talent',))
+  row = {'name': 'Hall', 'city': 'Oakland', 'state': 'CA', 'address': '1 Main St', 'phone': '123-123-1234',
+         'genres': 'Jazz', 'seeking_talent': 'yes', 'image_link': 'https://example.com/a.png',
+         'facebook_link': 'https://facebook.com/a', 'website': 'https://example.com'}
+  assert validate(row)[1] == {}
+  data, errors = validate({'name': 'Room'})
+  assert 'city' in errors and 'genres' in errors
+  assert data['seeking_talent'] is False
+
+def test_batch_api_rejects_shows_without_a_start_time(client):
+  venue = add_venue()
+  artist = add_artist()
+  response = client.post('/api/v1/shows/batch', json=[
+    {'venue_id': venue.id, 'artist_id': artist.id},
+    {'venue_id': venue.id, 'artist_id': artist.id, 'start_time': days_from_now(3).strftime('%Y-%m-%d %H:%M:%S')},
+  ])
+  assert response.status_code == 207
+  results = response.get_json()['results']
+  assert results[0]['status'] == 400 and 'start_time' in results[0]['errors']
+  assert results[1]['status'] == 201
+  assert app_module.Show.query.count() == 1
+
+def test_show_api_rejects_a_missing_start_time(client):
+  response = client.post('/api/v1/shows', json={'venue_id': add_venue().id, 'artist_id': add_artist().id})
+  assert response.status_code == 400
+  assert 'start_time' in response.get_json()['errors']
+
+def test_import_rejects_shows_without_a_start_time(app, tmp_path):
+  venue = add_venue()
+  artist = add_artist()
+  source = tmp_path / 'shows.jsonl'
+  source.write_text('{"venue_id": %d, "artist_id": %d}\n{"venue_id": %d, "artist_id": %d, "start_time": "2030-05-01 20:00:00"}\n'
+                    % (venue.id, artist.id, venue.id, artist.id))
+  errors = tmp_path / 'errors.jsonl'
+  result = app.test_cli_runner().invoke(args=['import', 'shows', str(source), '--errors', str(errors)])
+  assert result.exit_code == 0, result.output
+  assert 'done, 1 imported, 1 rejected' in result.output
+  assert '"line": 1' in errors.read_text()
+  assert [show.starts_at.year for show in app_module.Show.query] == [2030]
@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+import pytest
+
+import app as app_module
+from tests.helpers import add_artist, add_show, add_venue, days_from_now
+
+LISTINGS = [
+  '/api/v1/venues?fields=id,upcoming_shows_count,next_show_at',
+  '/api/v1/artists?fields=id,upcoming_shows_count,next_show_at',
+  '/artists',
+]
+
+def revalidate(client, path, etag):
+  return client.get(path, headers={'If-None-Match': etag})
+
+@pytest.mark.parametrize('path', LISTINGS)
+def test_listing_is_not_modified_until_a_write(client, path):
+  add_show(add_venue(), add_artist(), days_from_now(1))
+  etag = client.get(path).headers['ETag'].strip('"')
+  assert revalidate(client, path, etag).status_code == 304
+
+@pytest.mark.parametrize('path', LISTINGS)
+def test_listing_changes_when_a_show_is_booked(client, path):
+  venue = add_venue()
+  artist = add_artist()
+  add_show(venue, artist, days_from_now(2))
+  first = client.get(path)
+  add_show(venue, artist, days_from_now(1))
+  second = revalidate(client, path, first.headers['ETag'].strip('"'))
+  assert second.status_code == 200
+  assert second.headers['ETag'] != first.headers['ETag']
+  if path.startswith('/api/'):
+    assert first.get_json()['data'][0]['upcoming_shows_count'] == 1
+    assert second.get_json()['data'][0]['upcoming_shows_count'] == 2
+    assert second.get_json()['data'][0]['next_show_at'] != first.get_json()['data'][0]['next_show_at']
+
+@pytest.mark.parametrize('path', LISTINGS[:2])
+def test_listing_changes_when_a_show_is_deleted(client, path):
+  venue = add_venue()
+  artist = add_artist()
+  show = add_show(venue, artist, days_from_now(1))
+  first = client.get(path)
+  app_module.db.session.delete(show)
+  app_module.db.session.commit()
+  second = revalidate(client, path, first.headers['ETag'].strip('"'))
+  assert second.status_code == 200
+  assert second.get_json()['data'][0]['upcoming_shows_count'] == 0
+
+def test_listing_changes_when_a_recount_moves_a_show_to_the_past(app, client):
+  venue = add_venue()
+  show = add_show(venue, add_artist(), days_from_now(1))
+  path = LISTINGS[0]
+  first = client.get(path)
+  # The show starting is simulated by moving it back without the Show events
+  shows = app_module.Show.__table__
+  app_module.db.session.execute(shows.update().values(starts_at=days_from_now(-1), ends_at=days_from_now(-1) + timedelta(hours=2)))
+  app_module.db.session.commit()
+  result = app.test_cli_runner().invoke(args=['recount-shows', '--all'])
+  assert result.exit_code == 0, result.output
+  second = revalidate(client, path, first.headers['ETag'].strip('"'))
+  assert second.status_code == 200
+  assert second.get_json()['data'][0]['upcoming_shows_count'] == 0
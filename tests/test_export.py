@@ -0,0 +1,23 @@
+from tests.helpers import add_venue
+
+def test_export_answers_internal_clients(client):
+  add_venue(name='The Blue Note')
+  response = client.get('/export/venues')
+  assert response.status_code == 200
+  assert 'The Blue Note' in response.get_data(as_text=True)
+
+def test_export_is_hidden_from_other_clients(client):
+  add_venue(name='The Blue Note')
+  for kind in ('venues', 'artists', 'shows'):
+    response = client.get('/export/' + kind, environ_base={'REMOTE_ADDR': '203.0.113.7'})
+    assert response.status_code == 404
+
+def test_export_formats(app, client):
+  add_venue(name='The Blue Note')
+  response = client.get('/export/venues?format=jsonl')
+  assert response.mimetype == 'application/x-ndjson'
+  assert response.headers['Content-Disposition'] == 'attachment; filename=venues.jsonl'
+  result = app.test_cli_runner().invoke(args=['export', 'venues', '--format', 'jsonl'])
+  assert result.exit_code == 0, result.output
+  assert result.output == response.get_data(as_text=True)
+  assert client.get('/export/venues?format=xml').status_code == 400
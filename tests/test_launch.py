@@ -0,0 +1,26 @@
+import pytest
+
+import app as app_module
+
+@pytest.fixture
+def configured(app, tmp_path, monkeypatch):
+  # Undoes configure() afterwards, the log queue is set up once per process
+  monkeypatch.setitem(app.config, 'ERROR_LOG', str(tmp_path / 'error.log'))
+  handlers = list(app.logger.handlers)
+  level = app.logger.level
+  configured_before = app_module.log_queue is not None
+  yield app
+  if not configured_before:
+    app_module.log_queue.stop()
+    app_module.log_queue = None
+  app.logger.handlers[:] = handlers
+  app.logger.setLevel(level)
+
+def test_configure_is_idempotent(configured):
+  assert app_module.configure() is configured
+  log_queue = app_module.log_queue
+  handlers = list(configured.logger.handlers)
+  assert log_queue.handler in handlers
+  assert app_module.configure() is configured
+  assert app_module.log_queue is log_queue
+  assert configured.logger.handlers == handlers
@@ -0,0 +1,43 @@
+import pytest
+
+from tests.helpers import add_artist, add_show, add_venue, days_from_now
+
+@pytest.mark.parametrize('per_page', ['0', '-3'])
+def test_venues_page_size_is_at_least_one(client, per_page):
+  add_venue(name='North', city='Albany', state='NY')
+  add_venue(name='West', city='Oakland', state='CA')
+  response = client.get('/venues?per_page=' + per_page)
+  assert response.status_code == 200
+  body = response.get_data(as_text=True)
+  assert 'Oakland' in body and 'Albany' not in body
+
+def test_venues_pages_by_area(client):
+  for city in ('Fresno', 'Oakland', 'Tahoe'):
+    add_venue(name='Venue in ' + city, city=city, state='CA')
+  body = client.get('/venues?per_page=2').get_data(as_text=True)
+  assert 'Oakland' in body and 'Tahoe' not in body
+  assert 'after_city=Oakland' in body
+
+def upcoming_shows(count):
+  venue = add_venue()
+  artist = add_artist()
+  return [add_show(venue, artist, days_from_now(day + 1)) for day in range(count)]
+
+@pytest.mark.parametrize('per_page', ['0', '-1'])
+def test_shows_page_size_is_at_least_one(client, per_page):
+  upcoming_shows(2)
+  response = client.get('/shows?per_page=' + per_page)
+  assert response.status_code == 200
+  assert 'after_id=' in response.get_data(as_text=True)
+
+def test_shows_cursor_without_offset_is_utc(client):
+  first, second = upcoming_shows(2)
+  after_start = first.starts_at.replace(tzinfo=None).isoformat()
+  response = client.get('/shows?after_start=%s&after_id=%d' % (after_start, first.id))
+  assert response.status_code == 200
+  assert response.get_data(as_text=True).count('The Artist') == 1
+
+def test_shows_pages_follow_the_cursor(client):
+  shows = upcoming_shows(3)
+  body = client.get('/shows?per_page=2').get_data(as_text=True)
+  assert 'after_id=%d' % shows[1].id in body
@@ -0,0 +1,53 @@
+import logging
+import threading
+
+import pytest
+
+from logs import LogQueue
+
+class BlockedHandler(logging.Handler):
+  # Holds the writer thread in its first emit until released
+  def __init__(self):
+    super(BlockedHandler, self).__init__()
+    self.release = threading.Event()
+    self.messages = []
+
+  def emit(self, record):
+    self.release.wait(5)
+    self.messages.append(record.getMessage())
+
+def log_record(message):
+  return logging.LogRecord('test', logging.INFO, __file__, 1, message, None, None)
+
+def test_stop_writes_out_a_full_queue():
+  handler = BlockedHandler()
+  log_queue = LogQueue([handler], 2)
+  log_queue.start()
+  for number in range(6):
+    log_queue.handler.handle(log_record('record %d' % number))
+  assert log_queue.handler.dropped >= 3
+  errors = []
+  def stop():
+    try:
+      log_queue.stop()
+    except Exception as error:
+      errors.append(error)
+  stopping = threading.Thread(target=stop)
+  stopping.start()
+  handler.release.set()
+  stopping.join(5)
+  assert not stopping.is_alive() and not errors
+  assert len(handler.messages) == 6 - log_queue.handler.dropped
+  assert log_queue.listener is None
+
+def test_dropped_records_are_counted_in_the_metrics():
+  pytest.importorskip('prometheus_client')
+  from metrics import Metrics
+  log_queue = LogQueue([], 1)
+  metrics = Metrics((0.1, 1), 0)
+  metrics.watch_log_queue(log_queue)
+  log_queue.handler.dropped = 3
+  metrics.sample(True)
+  log_queue.handler.dropped = 5
+  metrics.sample(True)
+  assert metrics.registry.get_sample_value('fyyur_log_records_dropped_total') == 5
@@ -0,0 +1,36 @@
+import logging
+import os
+
+import flask_migrate
+import pytest
+from sqlalchemy import create_engine, inspect
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+@pytest.fixture
+def migrate(app, tmp_path):
+  # Runs the migrations on a database of their own, keeping the loggers the alembic config disables
+  url = 'sqlite:///' + str(tmp_path / 'migrated.db')
+  loggers = [logger for logger in logging.Logger.manager.loggerDict.values() if isinstance(logger, logging.Logger)]
+  disabled = {logger: logger.disabled for logger in loggers}
+  def upgrade(revision='head'):
+    original = app.config['SQLALCHEMY_DATABASE_URI']
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    try:
+      flask_migrate.upgrade(directory=MIGRATIONS, revision=revision)
+    finally:
+      app.config['SQLALCHEMY_DATABASE_URI'] = original
+    return create_engine(url)
+  yield upgrade
+  for logger, state in disabled.items():
+    logger.disabled = state
+
+def columns(engine, table):
+  return {column['name'] for column in inspect(engine).get_columns(table)}
+
+def test_upgrade_of_an_empty_database_drops_the_genres_strings(migrate):
+  engine = migrate('032c50e6a2e2')
+  assert 'genres' in columns(engine, 'venue')
+  engine = migrate()
+  for table in ('venue', 'artist'):
+    assert 'genres' not in columns(engine, table)
@@ -0,0 +1,32 @@
+import pytest
+
+from tests.helpers import add_artist, add_show, add_venue, count_queries, days_from_now
+
+def venue_with_shows(name, count):
+  venue = add_venue(name=name)
+  for number in range(count):
+    add_show(venue, add_artist(name='%s artist %d' % (name, number)), days_from_now(number - count // 2))
+  return venue
+
+def artist_with_shows(name, count):
+  artist = add_artist(name=name)
+  for number in range(count):
+    add_show(add_venue(name='%s venue %d' % (name, number)), artist, days_from_now(number - count // 2))
+  return artist
+
+def page_queries(client, path):
+  with count_queries() as queries:
+    response = client.get(path)
+  assert response.status_code == 200
+  return queries['count']
+
+@pytest.mark.parametrize('make, path', [(venue_with_shows, '/venues/%d'), (artist_with_shows, '/artists/%d')])
+def test_detail_page_queries_do_not_grow_with_shows(client, make, path):
+  few = make('Few', 5)
+  many = make('Many', 50)
+  assert page_queries(client, path % few.id) == page_queries(client, path % many.id)
+
+def test_venue_page_lists_past_and_upcoming_shows(client):
+  venue = venue_with_shows('Split', 4)
+  body = client.get('/venues/%d' % venue.id).get_data(as_text=True)
+  assert body.count('Split artist') == 4
@@ -0,0 +1,15 @@
+from sqlalchemy.pool import QueuePool
+
+from pool import pool_stats
+
+def test_internal_pool_reports_the_configured_overflow(app, client):
+  stats = client.get('/internal/pool').get_json()['database']
+  assert stats['pool'] == 'TimedQueuePool'
+  assert stats['max_overflow'] == app.config['DATABASE_MAX_OVERFLOW']
+  assert stats['checkouts'] >= 1
+
+def test_pool_stats_without_a_limit():
+  pool = QueuePool(lambda: None, pool_size=2, max_overflow=3)
+  stats = pool_stats(pool)
+  assert stats['size'] == 2 and stats['overflow'] == 0
+  assert 'max_overflow' not in stats
@@ -0,0 +1,30 @@
+import pytest
+
+from tests.helpers import add_artist, add_venue
+
+def search(client, kind, term, **form):
+  response = client.post('/%s/search' % kind, data=dict(form, search_term=term))
+  assert response.status_code == 200
+  return response.get_data(as_text=True)
+
+@pytest.mark.parametrize('term', ['Note', 'blue n', 'LU'])
+def test_venue_search_matches_names_case_insensitively(client, term):
+  add_venue(name='The Blue Note', city='Springfield')
+  assert 'The Blue Note' in search(client, 'venues', term)
+
+@pytest.mark.parametrize('term', ['Springfield', 'spr', 'Sp'])
+def test_venue_search_does_not_match_cities(client, term):
+  add_venue(name='The Blue Note', city='Springfield')
+  assert 'The Blue Note' not in search(client, 'venues', term)
+
+def test_artist_search_does_not_match_cities(client):
+  add_artist(name='Guns N Petals', city='Springfield')
+  assert 'Guns N Petals' in search(client, 'artists', 'petal')
+  assert 'Guns N Petals' not in search(client, 'artists', 'springfield')
+
+@pytest.mark.parametrize('limit', ['0', '-5'])
+def test_search_limit_is_at_least_one(client, limit):
+  add_venue(name='Band Hall')
+  add_venue(name='Band Room')
+  body = search(client, 'venues', 'band', limit=limit)
+  assert body.count('Band H') + body.count('Band R') == 1
@@ -0,0 +1,56 @@
+import app as app_module
+from suggest import PrefixIndex
+from tests.helpers import add_artist, add_venue
+
+def suggestions(client, prefix, **args):
+  response = client.get('/search/suggest', query_string=dict(args, q=prefix))
+  assert response.status_code == 200
+  return response.get_json()
+
+def test_suggest_limit_is_at_least_one(client):
+  add_venue(name='Band Hall')
+  add_venue(name='Band Room')
+  assert len(suggestions(client, 'band', limit=0)['venues']) == 1
+  assert len(suggestions(client, 'band', limit=-2)['venues']) == 1
+
+def test_suggest_picks_up_writes_made_elsewhere(client):
+  # Writes made without the views stand in for another worker or an import
+  venue = add_venue(name='Band Hall')
+  assert [match['name'] for match in suggestions(client, 'band')['venues']] == ['Band Hall']
+  add_venue(name='Band Room')
+  venue.name = 'Bandstand'
+  app_module.db.session.commit()
+  add_artist(name='Bandit')
+  body = suggestions(client, 'band')
+  assert [match['name'] for match in body['venues']] == ['Band Room', 'Bandstand']
+  assert [match['name'] for match in body['artists']] == ['Bandit']
+  app_module.db.session.delete(venue)
+  app_module.db.session.commit()
+  assert [match['name'] for match in suggestions(client, 'band')['venues']] == ['Band Room']
+
+def test_prefix_index_checks_its_version_every_check_seconds():
+  index = PrefixIndex(check_seconds=3600)
+  rows = [(1, 'Alpha')]
+  version = [1]
+  index.load(lambda: rows, lambda: version[0])
+  rows = [(1, 'Alpha'), (2, 'Alpine')]
+  version = [2]
+  index.load(lambda: rows, lambda: version[0])
+  assert [match['name'] for match in index.search('alp')] == ['Alpha']
+  index.invalidate()
+  index.load(lambda: rows, lambda: version[0])
+  assert [match['name'] for match in index.search('alp')] == ['Alpha', 'Alpine']
+
+def test_import_rebuilds_the_index(app, client, tmp_path):
+  app_module.db.session.add(app_module.Genre(name='Jazz'))
+  app_module.db.session.commit()
+  add_venue(name='Band Hall')
+  app_module.venue_suggestions.check_seconds = 3600
+  assert len(suggestions(client, 'band')['venues']) == 1
+  source = tmp_path / 'venues.csv'
+  source.write_text('name,city,state,address,phone,genres,image_link,facebook_link,website\n'
+                    'Band Room,Oakland,CA,1 Main St,123-123-1234,Jazz,https://example.com/a.png,https://facebook.com/a,https://example.com\n')
+  result = app.test_cli_runner().invoke(args=['import', 'venues', str(source), '--errors', str(tmp_path / 'errors.jsonl')])
+  assert result.exit_code == 0, result.output
+  assert 'done, 1 imported' in result.output
+  assert [match['name'] for match in suggestions(client, 'band')['venues']] == ['Band Hall', 'Band Room']
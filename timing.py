@@ -0,0 +1,164 @@
+#----------------------------------------------------------------------------#
+# Request timing.
+#
+# Records for every request its wall time, the time spent in SQL and the
+# number of statements (from engine events on every engine, replicas and
+# the async read path included), the template render time and the
+# response size. The timings go out in a Server-Timing header, readable in
+# the browser's network panel, and everything in one JSON log line per
+# request once the body has been sent. Requests running more than
+# TIMING_SQL_WARN statements are logged as warnings, which is where an N+1
+# query pattern shows up first.
+#
+# The figures of the current request live in a context variable, so the
+# engine events and template signals find them without a request context.
+#----------------------------------------------------------------------------#
+
+import json
+import time
+from contextvars import ContextVar
+
+from flask import before_render_template, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+current = ContextVar('request_timing', default=None)
+
+# Callables given every finished RequestTiming
+observers = []
+
+class RequestTiming(object):
+  def __init__(self, method, path):
+    self.method = method
+    self.path = path
+    self.endpoint = None
+    self.status = None
+    self.started = time.perf_counter()
+    self.sql_time = 0.0
+    self.sql_count = 0
+    self.render_time = 0.0
+    self.render_started = []
+    self.bytes = 0
+
+  def elapsed(self):
+    return time.perf_counter() - self.started
+
+  def server_timing(self):
+    # Header value with the figures known when the response starts
+    return 'app;dur=%.1f, db;dur=%.1f;desc="%d queries", render;dur=%.1f' % (
+      self.elapsed() * 1000, self.sql_time * 1000, self.sql_count, self.render_time * 1000)
+
+  def log_line(self):
+    return json.dumps({
+      'method': self.method,
+      'path': self.path,
+      'endpoint': self.endpoint,
+      'status': self.status,
+      'duration_ms': round(self.elapsed() * 1000, 3),
+      'sql_ms': round(self.sql_time * 1000, 3),
+      'sql_count': self.sql_count,
+      'render_ms': round(self.render_time * 1000, 3),
+      'bytes': self.bytes,
+    }, separators=(',', ':'))
+
+def start(method, path):
+  timing = RequestTiming(method, path)
+  current.set(timing)
+  return timing
+
+def finish(timing, logger, sql_warn):
+  current.set(None)
+  for observer in observers:
+    observer(timing)
+  if sql_warn and timing.sql_count > sql_warn:
+    logger.warning(timing.log_line())
+  else:
+    logger.info(timing.log_line())
+
+#----------------------------------------------------------------------------#
+# Recording.
+#----------------------------------------------------------------------------#
+
+def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+  if current.get() is not None:
+    connection.info.setdefault('timing_started', []).append(time.perf_counter())
+
+def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+  timing = current.get()
+  started = connection.info.get('timing_started')
+  if timing is not None and started:
+    timing.sql_time += time.perf_counter() - started.pop()
+    timing.sql_count += 1
+
+def handle_error(exception_context):
+  # A failed statement never reaches after_cursor_execute
+  connection = exception_context.connection
+  if connection is not None and connection.info.get('timing_started'):
+    connection.info['timing_started'].pop()
+
+def render_started(sender, template, context, **extra):
+  timing = current.get()
+  if timing is not None:
+    timing.render_started.append(time.perf_counter())
+
+def render_finished(sender, template, context, **extra):
+  timing = current.get()
+  if timing is not None and timing.render_started:
+    timing.render_time += time.perf_counter() - timing.render_started.pop()
+
+def note_endpoint():
+  timing = current.get()
+  if timing is not None:
+    timing.endpoint = request.endpoint
+
+class TimedBody(object):
+  # Counts the bytes of a WSGI response body and finishes the timing once the server closes it
+  def __init__(self, iterable, timing, close):
+    self.iterable = iterable
+    self.timing = timing
+    self._close = close
+
+  def __iter__(self):
+    for chunk in self.iterable:
+      self.timing.bytes += len(chunk)
+      yield chunk
+
+  def close(self):
+    try:
+      if hasattr(self.iterable, 'close'):
+        self.iterable.close()
+    finally:
+      self._close()
+
+class TimingMiddleware(object):
+  def __init__(self, wsgi_app, logger, header=True, sql_warn=0):
+    self.wsgi_app = wsgi_app
+    self.logger = logger
+    self.header = header
+    self.sql_warn = sql_warn
+
+  def __call__(self, environ, start_response):
+    timing = start(environ['REQUEST_METHOD'], environ.get('PATH_INFO', ''))
+    def timed_start_response(status, headers, exc_info=None):
+      timing.status = int(status.split(' ', 1)[0])
+      if self.header:
+        headers = headers + [('Server-Timing', timing.server_timing())]
+      return start_response(status, headers, exc_info)
+    try:
+      iterable = self.wsgi_app(environ, timed_start_response)
+    except Exception:
+      timing.status = 500
+      finish(timing, self.logger, self.sql_warn)
+      raise
+    return TimedBody(iterable, timing, lambda: finish(timing, self.logger, self.sql_warn))
+
+def register(app):
+  # Times the requests of app, logging them to the app.timing logger
+  event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+  event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+  event.listen(Engine, 'handle_error', handle_error)
+  before_render_template.connect(render_started, app)
+  template_rendered.connect(render_finished, app)
+  app.before_request(note_endpoint)
+  app.wsgi_app = TimingMiddleware(app.wsgi_app, app.logger.getChild('timing'),
+                                  app.config['SERVER_TIMING'], app.config['TIMING_SQL_WARN'])